@@ -3,10 +3,90 @@ from os import getenv
 from dataclasses import dataclass
 from dotenv import dotenv_values
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 # Referral bonus settings
 REFERRAL_BONUS_DAYS = 7  
+# Referral rewards are batched and written at most this often
+REFERRAL_FLUSH_INTERVAL = 1.0  # seconds
+
+# Subscription expiry: reminder lead time, sends of a reminder before
+# giving up (e.g. the user blocked the bot), how often upcoming deadlines
+# are loaded, and rows deactivated per transaction
+SUBSCRIPTION_REMINDER_DAYS = 3
+SUBSCRIPTION_REMINDER_ATTEMPTS = 3
+EXPIRY_CHECK_INTERVAL = 300  # seconds
+EXPIRY_BATCH_SIZE = 500
+
+# Number of pooled read-only database connections
+DB_READER_POOL_SIZE = 4
+
+# In-process cache for get_user / get_active_subscription
+DB_CACHE_SIZE = 10000
+DB_CACHE_TTL = 60  # seconds
+
+# How long processed payment charge ids are remembered in memory; older
+# duplicates are still caught by the unique index on payments
+PAYMENT_DEDUP_TTL = 3600  # seconds
+
+# Broadcast limits. Telegram allows about 30 messages per second overall
+# and about one message per second to the same chat.
+BROADCAST_RATE = 25  # messages per second
+BROADCAST_PER_CHAT_INTERVAL = 1.0  # seconds
+BROADCAST_WORKERS = 16
+BROADCAST_MAX_RETRIES = 3
+BROADCAST_BATCH_SIZE = 500
+# A running broadcast whose owner has not checkpointed for this long is
+# taken over by another instance; also how often instances look for such jobs
+BROADCAST_CLAIM_TIMEOUT = 300  # seconds
+
+# Per-user throttling: a user can send THROTTLE_BURST updates at once and
+# THROTTLE_RATE per second after that. Commands, button texts or callback
+# data listed in THROTTLE_COSTS count as that many updates.
+THROTTLE_RATE = 1.0  # updates per second
+THROTTLE_BURST = 5
+THROTTLE_COSTS = {
+    "/show_channel": 5,
+}
+# How often buckets of idle users are dropped
+THROTTLE_SWEEP_INTERVAL = 60  # seconds
+
+# FSM storage: keys kept in memory, seconds a key lives after its last
+# change, and how often the sqlite backend writes changes
+FSM_STORAGE_SIZE = 10000
+FSM_STORAGE_TTL = 24 * 3600  # seconds
+FSM_FLUSH_INTERVAL = 1.0  # seconds
+
+# Number of latest posts kept in memory and in the database per channel
+CHANNEL_FEED_SIZE = 20
+
+# Streamed OpenAI replies edit their message at most this often; Telegram
+# rate-limits edits of the same message
+OPENAI_EDIT_INTERVAL = 1.0  # seconds
+# Conversation messages kept in memory per user, and users kept in memory
+CHAT_HISTORY_SIZE = 50
+CHAT_HISTORY_USERS = 1000
+# Token budget for the messages sent with each request
+OPENAI_CONTEXT_TOKENS = 3000
+# Replace turns that no longer fit the budget with a short model-written
+# summary (one extra request whenever more turns fall out)
+OPENAI_SUMMARIZE_HISTORY = False
+OPENAI_SUMMARY_TOKENS = 200
+# OpenAI requests running at once, overall and per user
+OPENAI_MAX_CONCURRENCY = 8
+OPENAI_USER_CONCURRENCY = 1
+OPENAI_TIMEOUT = 60  # seconds per API call
+OPENAI_MAX_RETRIES = 3
+# Cache of responses to identical requests
+OPENAI_CACHE_SIZE = 1000
+OPENAI_CACHE_TTL = 3600  # seconds
+
+# Logging: write JSON lines (logs/*.jsonl) instead of plain text
+LOG_STRUCTURED = False
+# Max records the background log writer handles per wake-up
+LOG_BATCH_SIZE = 500
+# Share of events kept, by event name prefix, e.g. {"help": 0.1}
+LOG_SAMPLE_RATES = {}
 
 SUBSCRIPTION_PLANS = {
     "1month": {
@@ -50,12 +130,48 @@ class BotConfig:
 class TelethonConfig:
     api_id: Optional[str]
     api_hash: Optional[str]
-    channel_username: str
+    channel_username: str  # One channel or a comma-separated list
+
+    @property
+    def channels(self) -> List[str]:
+        return [name.strip() for name in self.channel_username.split(",") if name.strip()]
+
+@dataclass
+class WebhookConfig:
+    url: Optional[str]  # Public base URL; webhook mode is used when set
+    path: str
+    host: str
+    port: int
+    secret_token: Optional[str]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+@dataclass
+class MetricsConfig:
+    host: str
+    port: int  # 0 disables the metrics endpoint
+
+@dataclass
+class OpenAIConfig:
+    api_key: Optional[str]
+    base_url: Optional[str]  # OpenAI-compatible endpoint; None for api.openai.com
+    model: str
+    system_message: str
+
+@dataclass
+class FSMConfig:
+    storage: str  # memory or sqlite, see database.fsm_storage
 
 @dataclass
 class Config:
     bot: BotConfig
     telethon: TelethonConfig
+    webhook: WebhookConfig
+    metrics: MetricsConfig
+    openai: OpenAIConfig
+    fsm: FSMConfig
 
 def load_config(env_path: str = '.env') -> Config:
     config_values = dotenv_values(env_path)
@@ -73,4 +189,24 @@ def load_config(env_path: str = '.env') -> Config:
             api_hash=config_values.get("TELETHON_API_HASH"),
             channel_username=config_values.get("CHANNEL_USERNAME", "@telegram")
         ),
+        webhook=WebhookConfig(
+            url=config_values.get("WEBHOOK_URL") or None,
+            path=config_values.get("WEBHOOK_PATH") or "/webhook",
+            host=config_values.get("WEBAPP_HOST") or "0.0.0.0",
+            port=int(config_values.get("WEBAPP_PORT") or 8080),
+            secret_token=config_values.get("WEBHOOK_SECRET") or None
+        ),
+        metrics=MetricsConfig(
+            host=config_values.get("METRICS_HOST") or "127.0.0.1",
+            port=int(config_values.get("METRICS_PORT") or 9090)
+        ),
+        openai=OpenAIConfig(
+            api_key=config_values.get("OPENAI_API_KEY") or None,
+            base_url=config_values.get("OPENAI_BASE_URL") or None,
+            model=config_values.get("OPENAI_MODEL") or "gpt-4o",
+            system_message=config_values.get("OPENAI_SYSTEM_MESSAGE") or "You are a helpful assistant."
+        ),
+        fsm=FSMConfig(
+            storage=config_values.get("FSM_STORAGE") or "memory"
+        ),
     )
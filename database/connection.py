@@ -0,0 +1,114 @@
+import asyncio
+import aiosqlite
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Union
+
+# Wait for other connections' locks instead of failing at once
+BUSY_TIMEOUT_PRAGMA = "PRAGMA busy_timeout = 5000"
+
+# Applied to every pooled connection. journal_mode=WAL is persistent and
+# is set once by init_db(); these settings are per connection.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",  # 16 MB page cache
+    "PRAGMA mmap_size = 268435456",  # 256 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    BUSY_TIMEOUT_PRAGMA,
+)
+
+class ConnectionPool:
+    """
+    Long-lived aiosqlite connections shared by all database operations.
+
+    SQLite allows many readers but only one writer at a time, so the pool
+    keeps a bounded set of reader connections and a single writer guarded
+    by a lock.
+    """
+
+    def __init__(self, database_path: Union[str, Path], readers: int = 4):
+        self.database_path = database_path
+        self.size = readers
+        self._readers: Optional[asyncio.Queue] = None
+        self._reader_connections: List[aiosqlite.Connection] = []
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        connection = await aiosqlite.connect(self.database_path)
+        for pragma in CONNECTION_PRAGMAS:
+            await connection.execute(pragma)
+        return connection
+
+    async def open(self) -> None:
+        """Open writer and reader connections"""
+        if self.is_open:
+            return
+
+        self._write_lock = asyncio.Lock()
+        self._readers = asyncio.Queue(maxsize=self.size)
+        self._writer = await self._connect()
+        for _ in range(self.size):
+            connection = await self._connect()
+            self._reader_connections.append(connection)
+            self._readers.put_nowait(connection)
+
+    async def close(self) -> None:
+        """Close all pooled connections"""
+        if not self.is_open:
+            return
+
+        async with self._write_lock:
+            writer, self._writer = self._writer, None
+            await writer.close()
+
+        for connection in self._reader_connections:
+            await connection.close()
+        self._reader_connections = []
+        self._readers = None
+
+    def _check_open(self) -> None:
+        if not self.is_open:
+            raise RuntimeError("Database pool is not open, call open_pool() first")
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool"""
+        self._check_open()
+        readers = self._readers
+        connection = await readers.get()
+        try:
+            yield connection
+        finally:
+            readers.put_nowait(connection)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Get exclusive access to the writer connection"""
+        self._check_open()
+        async with self._write_lock:
+            connection = self._writer
+            try:
+                yield connection
+            except BaseException:
+                # Also on cancellation, so no transaction is left open
+                await connection.rollback()
+                raise
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Run statements on the writer in one BEGIN IMMEDIATE transaction
+
+        The write lock is taken up front, so a read-modify-write inside the
+        block cannot interleave with other writers. Commits on success and
+        rolls back on error.
+        """
+        async with self.writer() as connection:
+            await connection.execute("BEGIN IMMEDIATE")
+            yield connection
+            await connection.commit()
@@ -1,8 +1,13 @@
 import aiosqlite
-from datetime import datetime
-from typing import Optional, List
-from .models import User, Subscription
+from datetime import datetime, timedelta
+from typing import Optional, List, AsyncIterator, Dict, Tuple
+from .models import User, Subscription, BroadcastJob, ChannelPost, Payment, ChatHistory
+import json
+from .connection import ConnectionPool, BUSY_TIMEOUT_PRAGMA
 from services.logger import log_event, log_error
+from config.config import DB_READER_POOL_SIZE, DB_CACHE_SIZE, DB_CACHE_TTL, PAYMENT_DEDUP_TTL
+from utils.cache import TTLCache, MISSING
+from services.metrics import DB_SECONDS, collectors
 from pathlib import Path
 
 # Create data directory if it doesn't exist
@@ -11,9 +16,144 @@ DATA_DIR.mkdir(exist_ok=True)
 
 DATABASE_PATH = DATA_DIR / "bot.db"
 
+# Shared connections, opened by open_pool() on startup
+pool = ConnectionPool(DATABASE_PATH, readers=DB_READER_POOL_SIZE)
+
+# Read caches keyed by user_id, invalidated by the write operations below
+user_cache = TTLCache(maxsize=DB_CACHE_SIZE, ttl=DB_CACHE_TTL)
+subscription_cache = TTLCache(maxsize=DB_CACHE_SIZE, ttl=DB_CACHE_TTL)
+
+# Charge ids recently recorded or being recorded by record_payment()
+recent_charges = TTLCache(maxsize=DB_CACHE_SIZE, ttl=PAYMENT_DEDUP_TTL)
+
+# Schema upgrades applied in order on startup. The position in the list is
+# the schema version stored in PRAGMA user_version; never edit or reorder
+# released entries, only append new ones.
+MIGRATIONS = [
+    # 1: indexes for subscription lookups and user queries
+    [
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_user_active_end
+        ON subscriptions (user_id, is_active, end_date)
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_users_referrer_id ON users (referrer_id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_is_active ON users (is_active)",
+    ],
+    # 2: covering index for keyset pagination over active users
+    [
+        "CREATE INDEX IF NOT EXISTS idx_users_active_user_id ON users (is_active, user_id)",
+        "DROP INDEX IF EXISTS idx_users_is_active",
+    ],
+    # 3: durable broadcast jobs with a recipient checkpoint
+    [
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            audience TEXT NOT NULL,
+            exclude_users TEXT NOT NULL DEFAULT '[]',
+            status TEXT NOT NULL DEFAULT 'running',
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            excluded INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs (status)",
+    ],
+    # 4: recent channel posts kept for warm restarts of the channel feed
+    [
+        """
+        CREATE TABLE IF NOT EXISTS channel_posts (
+            channel TEXT NOT NULL,
+            message_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            date TIMESTAMP NOT NULL,
+            has_media BOOLEAN NOT NULL DEFAULT FALSE,
+            PRIMARY KEY (channel, message_id)
+        )
+        """,
+    ],
+    # 5: indexes for db_viewer filters and reports, and expiry sweeps
+    [
+        "CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)",
+        "CREATE INDEX IF NOT EXISTS idx_users_referral_count ON users (referral_count)",
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_type_active_end
+        ON subscriptions (subscription_type, is_active, end_date)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_active_end
+        ON subscriptions (is_active, end_date)
+        """,
+    ],
+    # 6: end_date a renewal reminder was last sent for
+    [
+        "ALTER TABLE subscriptions ADD COLUMN reminded_end_date TIMESTAMP",
+    ],
+    # 7: successful payments, at most one row per Telegram charge
+    [
+        """
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_payment_charge_id TEXT NOT NULL UNIQUE,
+            provider_payment_charge_id TEXT,
+            user_id INTEGER NOT NULL,
+            plan_id TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            total_amount INTEGER NOT NULL,
+            subscription_id INTEGER,
+            created_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_payments_user_id ON payments (user_id)",
+    ],
+    # 8: OpenAI conversation history with cached token counts
+    [
+        """
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            tokens INTEGER NOT NULL,
+            created_at TIMESTAMP NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_chat_history_user_created
+        ON chat_history (user_id, created_at)
+        """,
+    ],
+    # 9: FSM states and data persisted by database.fsm_storage.SQLiteStorage
+    [
+        """
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            updated_at TIMESTAMP NOT NULL
+        )
+        """,
+    ],
+    # 10: instance running a broadcast job, so replicas do not run it twice
+    [
+        "ALTER TABLE broadcast_jobs ADD COLUMN owner TEXT",
+    ],
+]
+
 async def init_db():
-    """Initialize database and create tables if they don't exist"""
+    """Initialize database, create tables if they don't exist and apply migrations"""
     async with aiosqlite.connect(DATABASE_PATH) as db:
+        # Replicas may start at the same time and initialize concurrently
+        await db.execute(BUSY_TIMEOUT_PRAGMA)
+        # WAL lets readers run alongside the writer; the mode is stored in the file
+        await db.execute("PRAGMA journal_mode = WAL")
+
         # Create users table
         await db.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -42,10 +182,67 @@ async def init_db():
         """)
         
         await db.commit()
+        await migrate_db(db)
 
+async def migrate_db(db: aiosqlite.Connection):
+    """
+    Apply pending migrations, each in its own transaction
+
+    Several processes may migrate the same file at once, so the version is
+    read inside a BEGIN IMMEDIATE transaction: whoever holds the write lock
+    applies the next migration and the others see it as done.
+    """
+    while True:
+        # sqlite3 does not open transactions for DDL by itself; without
+        # BEGIN every statement would commit on its own
+        await db.execute("BEGIN IMMEDIATE")
+        async with db.execute("PRAGMA user_version") as cursor:
+            version = (await cursor.fetchone())[0]
+        if version >= len(MIGRATIONS):
+            await db.rollback()
+            return
+
+        number = version + 1
+        try:
+            for statement in MIGRATIONS[version]:
+                await db.execute(statement)
+            # PRAGMA does not accept parameters; number is a trusted int
+            await db.execute(f"PRAGMA user_version = {number}")
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            log_error(0, e, f"database_migration_{number}_error")
+            raise
+        log_event(0, f"database_migrated_to_{number}")
+
+async def open_pool():
+    """Open shared database connections"""
+    await pool.open()
+
+async def close_pool():
+    """Close shared database connections"""
+    await pool.close()
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters of the read caches"""
+    return {
+        "users": user_cache.stats(),
+        "subscriptions": subscription_cache.stats(),
+    }
+
+def _cache_metrics() -> list:
+    lines = ["# TYPE bot_db_cache_lookups_total counter"]
+    for cache, stats in get_cache_stats().items():
+        lines.append(f'bot_db_cache_lookups_total{{cache="{cache}",result="hit"}} {stats["hits"]}')
+        lines.append(f'bot_db_cache_lookups_total{{cache="{cache}",result="miss"}} {stats["misses"]}')
+    return lines
+
+collectors.append(_cache_metrics)
+
+@DB_SECONDS.time()
 async def add_user(user_id: int, username: str, name: str, referrer_id: Optional[int] = None):
     """Add new user to database"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with pool.writer() as db:
         await db.execute(
             """
             INSERT INTO users (user_id, username, name, created_at, referrer_id, referral_count)
@@ -54,57 +251,113 @@ async def add_user(user_id: int, username: str, name: str, referrer_id: Optional
             (user_id, username, name, datetime.now(), referrer_id, 0)
         )
         await db.commit()
+    user_cache.invalidate(user_id)
 
 async def get_user(user_id: int) -> Optional[User]:
     """Get user by user_id"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    user = user_cache.get(user_id)
+    if user is not MISSING:
+        return user
+
+    generation = user_cache.generation
+    user = await _load_user(user_id)
+    user_cache.set(user_id, user, generation=generation)
+    return user
+
+# Timed apart from get_user so cache hits stay out of the latency histogram
+@DB_SECONDS.time("get_user")
+async def _load_user(user_id: int) -> Optional[User]:
+    async with pool.reader() as db:
         async with db.execute(
             "SELECT * FROM users WHERE user_id = ?", (user_id,)
         ) as cursor:
             user_data = await cursor.fetchone()
-            
-            if user_data is None:
-                return None
-                
-            return User(
-                id=user_data[0],
-                user_id=user_data[1],
-                username=user_data[2],
-                name=user_data[3],
-                created_at=datetime.fromisoformat(user_data[4]),
-                is_active=bool(user_data[5]),
-                referrer_id=user_data[6],
-                referral_count=user_data[7]
-            )
+
+    if user_data is None:
+        return None
+    return User(
+        id=user_data[0],
+        user_id=user_data[1],
+        username=user_data[2],
+        name=user_data[3],
+        created_at=datetime.fromisoformat(user_data[4]),
+        is_active=bool(user_data[5]),
+        referrer_id=user_data[6],
+        referral_count=user_data[7]
+    )
 
 # Subscription operations
-async def create_subscription(user_id: int, subscription_type: str, start_date: datetime, end_date: datetime):
-    """Create or extend subscription"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # First, check if user has active subscription
-        current_sub = await get_active_subscription(user_id)
-        
-        if current_sub:
-            # If subscription exists, extend it
-            new_end_date = max(current_sub.end_date, start_date) + (end_date - start_date)
-            query = """
-                UPDATE subscriptions 
-                SET end_date = $1 
-                WHERE user_id = $2 AND is_active = true
-            """
-            await db.execute(query, (new_end_date, user_id))
-        else:
-            # If no subscription, create new one
-            query = """
-                INSERT INTO subscriptions (user_id, subscription_type, start_date, end_date, is_active)
-                VALUES ($1, $2, $3, $4, $5)
-            """
-            await db.execute(query, (user_id, subscription_type, start_date, end_date, True))
-        await db.commit()
+async def _create_or_extend_subscription(
+    db: aiosqlite.Connection,
+    user_id: int,
+    subscription_type: str,
+    start_date: datetime,
+    end_date: datetime
+) -> Subscription:
+    """Extend the active subscription or insert a new one; call inside a transaction"""
+    async with db.execute(
+        """
+        SELECT * FROM subscriptions
+        WHERE user_id = ? AND is_active = TRUE AND end_date > ?
+        ORDER BY end_date DESC LIMIT 1
+        """,
+        (user_id, datetime.now())
+    ) as cursor:
+        sub_data = await cursor.fetchone()
+
+    if sub_data:
+        # If subscription exists, extend it
+        current_end_date = datetime.fromisoformat(sub_data[4])
+        new_end_date = max(current_end_date, start_date) + (end_date - start_date)
+        await db.execute(
+            "UPDATE subscriptions SET end_date = ? WHERE id = ?",
+            (new_end_date, sub_data[0])
+        )
+        return Subscription(
+            id=sub_data[0],
+            user_id=sub_data[1],
+            subscription_type=sub_data[2],
+            start_date=datetime.fromisoformat(sub_data[3]),
+            end_date=new_end_date,
+            is_active=True
+        )
 
+    # If no subscription, create new one
+    cursor = await db.execute(
+        """
+        INSERT INTO subscriptions (user_id, subscription_type, start_date, end_date, is_active)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (user_id, subscription_type, start_date, end_date, True)
+    )
+    return Subscription(
+        id=cursor.lastrowid,
+        user_id=user_id,
+        subscription_type=subscription_type,
+        start_date=start_date,
+        end_date=end_date,
+        is_active=True
+    )
+
+@DB_SECONDS.time()
+async def create_subscription(
+    user_id: int,
+    subscription_type: str,
+    start_date: datetime,
+    end_date: datetime
+) -> Subscription:
+    """Create or extend subscription atomically and return its new state"""
+    async with pool.transaction() as db:
+        subscription = await _create_or_extend_subscription(
+            db, user_id, subscription_type, start_date, end_date
+        )
+    subscription_cache.invalidate(user_id)
+    return subscription
+
+@DB_SECONDS.time()
 async def cancel_subscription(user_id: int) -> None:
     """Cancel all active subscriptions for user"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with pool.writer() as db:
         await db.execute(
             """
             UPDATE subscriptions 
@@ -114,10 +367,16 @@ async def cancel_subscription(user_id: int) -> None:
             (user_id,)
         )
         await db.commit()
+    subscription_cache.invalidate(user_id)
 
+@DB_SECONDS.time()
 async def extend_subscription(subscription_id: int, new_end_date: datetime) -> None:
     """Extend subscription end date"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with pool.writer() as db:
+        async with db.execute(
+            "SELECT user_id FROM subscriptions WHERE id = ?", (subscription_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
         await db.execute(
             """
             UPDATE subscriptions 
@@ -127,35 +386,54 @@ async def extend_subscription(subscription_id: int, new_end_date: datetime) -> N
             (new_end_date, subscription_id)
         )
         await db.commit()
+    if row is not None:
+        subscription_cache.invalidate(row[0])
 
 async def get_active_subscription(user_id: int) -> Optional[Subscription]:
     """Get active subscription for user"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    now = datetime.now()
+    subscription = subscription_cache.get(user_id)
+    if subscription is not MISSING:
+        # The cached row is the latest-ending one, so once it has expired
+        # the user has no active subscription at all
+        if subscription is not None and subscription.end_date <= now:
+            return None
+        return subscription
+
+    generation = subscription_cache.generation
+    subscription = await _load_active_subscription(user_id, now)
+    subscription_cache.set(user_id, subscription, generation=generation)
+    return subscription
+
+# Timed apart from get_active_subscription so cache hits stay out of the latency histogram
+@DB_SECONDS.time("get_active_subscription")
+async def _load_active_subscription(user_id: int, now: datetime) -> Optional[Subscription]:
+    async with pool.reader() as db:
         async with db.execute(
             """
             SELECT * FROM subscriptions 
             WHERE user_id = ? AND is_active = TRUE AND end_date > ?
             ORDER BY end_date DESC LIMIT 1
             """,
-            (user_id, datetime.now())
+            (user_id, now)
         ) as cursor:
             sub_data = await cursor.fetchone()
-            
-            if sub_data is None:
-                return None
-                
-            return Subscription(
-                id=sub_data[0],
-                user_id=sub_data[1],
-                subscription_type=sub_data[2],
-                start_date=datetime.fromisoformat(sub_data[3]),
-                end_date=datetime.fromisoformat(sub_data[4]),
-                is_active=bool(sub_data[5])
-            )
 
+    if sub_data is None:
+        return None
+    return Subscription(
+        id=sub_data[0],
+        user_id=sub_data[1],
+        subscription_type=sub_data[2],
+        start_date=datetime.fromisoformat(sub_data[3]),
+        end_date=datetime.fromisoformat(sub_data[4]),
+        is_active=bool(sub_data[5])
+    )
+
+@DB_SECONDS.time()
 async def update_referral_count(user_id: int):
     """Increment referral count for user"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with pool.writer() as db:
         await db.execute(
             """
             UPDATE users 
@@ -165,10 +443,43 @@ async def update_referral_count(user_id: int):
             (user_id,)
         )
         await db.commit()
+    user_cache.invalidate(user_id)
 
+@DB_SECONDS.time()
+async def apply_referral_rewards(referrals: Dict[int, int], bonus_days: int) -> None:
+    """
+    Credit referrers in one transaction
+
+    Args:
+        referrals: Number of new referrals per referrer user_id
+        bonus_days: Subscription days granted per referral
+    """
+    start_date = datetime.now()
+    async with pool.transaction() as db:
+        await db.executemany(
+            """
+            UPDATE users 
+            SET referral_count = referral_count + ? 
+            WHERE user_id = ?
+            """,
+            [(count, referrer_id) for referrer_id, count in referrals.items()]
+        )
+        for referrer_id, count in referrals.items():
+            await _create_or_extend_subscription(
+                db,
+                referrer_id,
+                "referral_bonus",
+                start_date,
+                start_date + timedelta(days=bonus_days * count)
+            )
+    for referrer_id in referrals:
+        user_cache.invalidate(referrer_id)
+        subscription_cache.invalidate(referrer_id)
+
+@DB_SECONDS.time()
 async def get_active_users() -> List[User]:
     """Get all active users"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with pool.reader() as db:
         async with db.execute(
             "SELECT * FROM users WHERE is_active = TRUE"
         ) as cursor:
@@ -185,3 +496,437 @@ async def get_active_users() -> List[User]:
                     referral_count=user[7]
                 ) for user in users
             ]
+
+async def iter_active_user_ids(
+    chunk_size: int = 1000,
+    after_user_id: int = 0
+) -> AsyncIterator[List[int]]:
+    """
+    Yield user_ids of active users greater than after_user_id in ascending chunks
+
+    Uses keyset pagination so memory stays bounded by chunk_size and each
+    page is a range scan over the (is_active, user_id) index.
+    """
+    last_user_id = after_user_id  # Telegram user ids are positive
+    while True:
+        async with pool.reader() as db:
+            async with db.execute(
+                """
+                SELECT user_id FROM users
+                WHERE is_active = TRUE AND user_id > ?
+                ORDER BY user_id LIMIT ?
+                """,
+                (last_user_id, chunk_size)
+            ) as cursor:
+                rows = await cursor.fetchall()
+
+        if not rows:
+            return
+        chunk = [row[0] for row in rows]
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_user_id = chunk[-1]
+
+# Broadcast job operations
+@DB_SECONDS.time()
+async def create_broadcast_job(
+    text: str,
+    audience: str,
+    exclude_users: List[int],
+    owner: str
+) -> BroadcastJob:
+    """Create a broadcast job in running state, claimed by owner"""
+    now = datetime.now()
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            """
+            INSERT INTO broadcast_jobs (text, audience, exclude_users, created_at, updated_at, owner)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (text, audience, json.dumps(exclude_users), now, now, owner)
+        )
+        job_id = cursor.lastrowid
+        await db.commit()
+
+    return BroadcastJob(
+        id=job_id,
+        text=text,
+        audience=audience,
+        exclude_users=exclude_users,
+        status="running",
+        last_user_id=0,
+        total=0,
+        sent=0,
+        failed=0,
+        excluded=0,
+        created_at=now,
+        updated_at=now,
+        owner=owner
+    )
+
+@DB_SECONDS.time()
+async def checkpoint_broadcast_job(job: BroadcastJob) -> bool:
+    """
+    Persist progress counters and cursor of a broadcast job
+
+    Returns:
+        False if the job is no longer owned by job.owner; nothing is written
+    """
+    job.updated_at = datetime.now()
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            """
+            UPDATE broadcast_jobs
+            SET status = ?, last_user_id = ?, total = ?, sent = ?, failed = ?,
+                excluded = ?, updated_at = ?, owner = ?
+            WHERE id = ? AND owner IS ?
+            """,
+            (job.status, job.last_user_id, job.total, job.sent, job.failed,
+             job.excluded, job.updated_at, job.owner, job.id, job.owner)
+        )
+        await db.commit()
+    return cursor.rowcount == 1
+
+@DB_SECONDS.time()
+async def claim_broadcast_job(job: BroadcastJob, owner: str, stale_after: timedelta) -> bool:
+    """
+    Take over a running job that has no owner or whose owner stopped checkpointing
+
+    Returns:
+        True if owner now holds the job
+    """
+    now = datetime.now()
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            """
+            UPDATE broadcast_jobs SET owner = ?, updated_at = ?
+            WHERE id = ? AND status = 'running'
+            AND (owner IS NULL OR updated_at < ?)
+            """,
+            (owner, now, job.id, now - stale_after)
+        )
+        await db.commit()
+    if cursor.rowcount != 1:
+        return False
+    job.owner = owner
+    job.updated_at = now
+    return True
+
+@DB_SECONDS.time()
+async def release_broadcast_job(job: BroadcastJob) -> None:
+    """Give up a running job so another instance can resume it right away"""
+    async with pool.writer() as db:
+        await db.execute(
+            "UPDATE broadcast_jobs SET owner = NULL WHERE id = ? AND owner = ?",
+            (job.id, job.owner)
+        )
+        await db.commit()
+
+@DB_SECONDS.time()
+async def get_running_broadcast_jobs() -> List[BroadcastJob]:
+    """Get broadcast jobs that have not finished yet, oldest first"""
+    async with pool.reader() as db:
+        async with db.execute(
+            "SELECT * FROM broadcast_jobs WHERE status = 'running' ORDER BY id"
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+    return [
+        BroadcastJob(
+            id=row[0],
+            text=row[1],
+            audience=row[2],
+            exclude_users=json.loads(row[3]),
+            status=row[4],
+            last_user_id=row[5],
+            total=row[6],
+            sent=row[7],
+            failed=row[8],
+            excluded=row[9],
+            created_at=datetime.fromisoformat(row[10]),
+            updated_at=datetime.fromisoformat(row[11]),
+            owner=row[12]
+        ) for row in rows
+    ]
+
+# Channel post operations
+@DB_SECONDS.time()
+async def save_channel_posts(posts: List[ChannelPost], keep: int) -> None:
+    """Store channel posts, keeping only the newest `keep` per channel"""
+    if not posts:
+        return
+    async with pool.writer() as db:
+        await db.executemany(
+            """
+            INSERT OR REPLACE INTO channel_posts (channel, message_id, text, date, has_media)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(p.channel, p.message_id, p.text, p.date, p.has_media) for p in posts]
+        )
+        for channel in {p.channel for p in posts}:
+            await db.execute(
+                """
+                DELETE FROM channel_posts
+                WHERE channel = ? AND message_id NOT IN (
+                    SELECT message_id FROM channel_posts
+                    WHERE channel = ? ORDER BY message_id DESC LIMIT ?
+                )
+                """,
+                (channel, channel, keep)
+            )
+        await db.commit()
+
+@DB_SECONDS.time()
+async def get_channel_posts(channel: str, limit: int) -> List[ChannelPost]:
+    """Get the newest posts of a channel, oldest first"""
+    async with pool.reader() as db:
+        async with db.execute(
+            """
+            SELECT channel, message_id, text, date, has_media FROM channel_posts
+            WHERE channel = ? ORDER BY message_id DESC LIMIT ?
+            """,
+            (channel, limit)
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+    return [
+        ChannelPost(
+            channel=row[0],
+            message_id=row[1],
+            text=row[2],
+            date=datetime.fromisoformat(row[3]),
+            has_media=bool(row[4])
+        ) for row in reversed(rows)
+    ]
+
+# Expiry operations
+@DB_SECONDS.time()
+async def get_expiring_subscriptions(after: datetime, until: datetime) -> List[Subscription]:
+    """Get active subscriptions ending in (after, until], soonest first"""
+    async with pool.reader() as db:
+        async with db.execute(
+            """
+            SELECT id, user_id, subscription_type, start_date, end_date, is_active,
+                   reminded_end_date
+            FROM subscriptions
+            WHERE is_active = TRUE AND end_date > ? AND end_date <= ?
+            ORDER BY end_date
+            """,
+            (after, until)
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+    return [
+        Subscription(
+            id=row[0],
+            user_id=row[1],
+            subscription_type=row[2],
+            start_date=datetime.fromisoformat(row[3]),
+            end_date=datetime.fromisoformat(row[4]),
+            is_active=bool(row[5]),
+            reminded_end_date=datetime.fromisoformat(row[6]) if row[6] else None
+        ) for row in rows
+    ]
+
+@DB_SECONDS.time()
+async def deactivate_expired_subscriptions(now: datetime, batch_size: int = 500) -> int:
+    """Mark subscriptions that ended before now inactive, batch_size rows per transaction"""
+    deactivated = 0
+    while True:
+        async with pool.transaction() as db:
+            async with db.execute(
+                """
+                SELECT id, user_id FROM subscriptions
+                WHERE is_active = TRUE AND end_date <= ?
+                LIMIT ?
+                """,
+                (now, batch_size)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            await db.executemany(
+                "UPDATE subscriptions SET is_active = FALSE WHERE id = ?",
+                [(row[0],) for row in rows]
+            )
+
+        for _, user_id in rows:
+            subscription_cache.invalidate(user_id)
+        deactivated += len(rows)
+        if len(rows) < batch_size:
+            return deactivated
+
+@DB_SECONDS.time()
+async def claim_subscription_reminder(subscription_id: int, end_date: datetime) -> bool:
+    """
+    Record that a reminder is being sent for this end date
+
+    Returns:
+        False if the subscription changed or was already reminded
+    """
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            """
+            UPDATE subscriptions SET reminded_end_date = end_date
+            WHERE id = ? AND is_active = TRUE AND end_date = ?
+            AND (reminded_end_date IS NULL OR reminded_end_date != end_date)
+            """,
+            (subscription_id, end_date)
+        )
+        await db.commit()
+    return cursor.rowcount == 1
+
+@DB_SECONDS.time()
+async def release_subscription_reminder(subscription_id: int, end_date: datetime) -> None:
+    """Undo claim_subscription_reminder after the reminder could not be sent"""
+    async with pool.writer() as db:
+        await db.execute(
+            """
+            UPDATE subscriptions SET reminded_end_date = NULL
+            WHERE id = ? AND reminded_end_date = ?
+            """,
+            (subscription_id, end_date)
+        )
+        await db.commit()
+
+# Payment operations
+@DB_SECONDS.time()
+async def record_payment(payment: Payment, days: int) -> Optional[Subscription]:
+    """
+    Store a successful payment and grant its subscription days atomically
+
+    Telegram may deliver the same payment more than once; the unique
+    charge id makes repeated calls no-ops, including across restarts.
+
+    Args:
+        payment: Payment to store; id, subscription_id and created_at are set here
+        days: Subscription days the payment buys
+
+    Returns:
+        New subscription state, or None if the charge was already recorded
+    """
+    charge_id = payment.telegram_payment_charge_id
+    if recent_charges.get(charge_id) is not MISSING:
+        return None
+    # Claimed before the first await so concurrent duplicates stop here
+    recent_charges.set(charge_id, True)
+
+    try:
+        now = datetime.now()
+        async with pool.transaction() as db:
+            cursor = await db.execute(
+                """
+                INSERT OR IGNORE INTO payments (
+                    telegram_payment_charge_id, provider_payment_charge_id, user_id,
+                    plan_id, currency, total_amount, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (charge_id, payment.provider_payment_charge_id, payment.user_id,
+                 payment.plan_id, payment.currency, payment.total_amount, now)
+            )
+            if cursor.rowcount == 0:
+                return None
+            payment.id = cursor.lastrowid
+            payment.created_at = now
+
+            subscription = await _create_or_extend_subscription(
+                db, payment.user_id, payment.plan_id, now, now + timedelta(days=days)
+            )
+            payment.subscription_id = subscription.id
+            await db.execute(
+                "UPDATE payments SET subscription_id = ? WHERE id = ?",
+                (subscription.id, payment.id)
+            )
+    except BaseException:
+        # Nothing was stored; let a retry through
+        recent_charges.invalidate(charge_id)
+        raise
+
+    subscription_cache.invalidate(payment.user_id)
+    return subscription
+
+# Chat history operations
+@DB_SECONDS.time()
+async def add_chat_message(entry: ChatHistory) -> ChatHistory:
+    """Store a chat message; sets its id and created_at"""
+    entry.created_at = entry.created_at or datetime.now()
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            """
+            INSERT INTO chat_history (user_id, role, content, tokens, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (entry.user_id, entry.role, entry.content, entry.tokens, entry.created_at)
+        )
+        await db.commit()
+    entry.id = cursor.lastrowid
+    return entry
+
+@DB_SECONDS.time()
+async def get_chat_history(user_id: int, limit: int) -> List[ChatHistory]:
+    """Get the newest messages of a user's conversation, oldest first"""
+    async with pool.reader() as db:
+        async with db.execute(
+            """
+            SELECT id, user_id, role, content, tokens, created_at FROM chat_history
+            WHERE user_id = ? ORDER BY created_at DESC LIMIT ?
+            """,
+            (user_id, limit)
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+    return [
+        ChatHistory(
+            id=row[0],
+            user_id=row[1],
+            role=row[2],
+            content=row[3],
+            tokens=row[4],
+            created_at=datetime.fromisoformat(row[5])
+        ) for row in reversed(rows)
+    ]
+
+@DB_SECONDS.time()
+async def clear_chat_history(user_id: int) -> None:
+    """Delete a user's conversation"""
+    async with pool.writer() as db:
+        await db.execute("DELETE FROM chat_history WHERE user_id = ?", (user_id,))
+        await db.commit()
+
+# FSM storage operations
+@DB_SECONDS.time()
+async def get_fsm_record(key: str) -> Optional[Tuple[Optional[str], dict]]:
+    """Get (state, data) stored for an FSM key"""
+    async with pool.reader() as db:
+        async with db.execute(
+            "SELECT state, data FROM fsm_storage WHERE key = ?", (key,)
+        ) as cursor:
+            row = await cursor.fetchone()
+    if row is None:
+        return None
+    return row[0], json.loads(row[1])
+
+@DB_SECONDS.time()
+async def save_fsm_records(records: Dict[str, Optional[Tuple[Optional[str], str]]]) -> None:
+    """Write FSM records of (state, JSON-encoded data) in one transaction; None deletes the key"""
+    now = datetime.now()
+    upserts = []
+    deletes = []
+    for key, record in records.items():
+        if record is None:
+            deletes.append((key,))
+        else:
+            state, data = record
+            upserts.append((key, state, data, now))
+
+    async with pool.transaction() as db:
+        if upserts:
+            await db.executemany(
+                """
+                INSERT INTO fsm_storage (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+                """,
+                upserts
+            )
+        if deletes:
+            await db.executemany("DELETE FROM fsm_storage WHERE key = ?", deletes)
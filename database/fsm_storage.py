@@ -0,0 +1,167 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config.config import FSM_STORAGE_SIZE, FSM_STORAGE_TTL, FSM_FLUSH_INTERVAL
+from services.logger import log_error
+from .db_operations import get_fsm_record, save_fsm_records
+from .write_behind import FlushScheduler
+
+
+def encode_key(key: StorageKey) -> str:
+    """Text form of a storage key, used as the fsm_storage primary key"""
+    return (
+        f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+        f"{key.business_connection_id or ''}:{key.destiny}"
+    )
+
+
+class LRUStorage(BaseStorage):
+    """
+    In-memory FSM storage holding at most `maxsize` keys.
+
+    Records expire `ttl` seconds after their last change, and the least
+    recently used key is dropped when the storage is full. Keys without a
+    state or data are not stored at all. State is lost on restart.
+    """
+
+    def __init__(self, maxsize: int = FSM_STORAGE_SIZE, ttl: float = FSM_STORAGE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> [state, data, expires_at]
+        self._records: "OrderedDict[StorageKey, list]" = OrderedDict()
+
+    def _cached(self, key: StorageKey) -> Optional[list]:
+        record = self._records.get(key)
+        if record is not None:
+            if record[2] > time.monotonic():
+                self._records.move_to_end(key)
+                return record
+            del self._records[key]
+        return None
+
+    def _cache(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._records[key] = [state, data, time.monotonic() + self.ttl]
+        self._records.move_to_end(key)
+        if len(self._records) > self.maxsize:
+            self._records.popitem(last=False)
+
+    async def _record(self, key: StorageKey) -> Optional[list]:
+        return self._cached(key)
+
+    async def _write(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        if state is None and not data:
+            self._records.pop(key, None)
+        else:
+            self._cache(key, state, data)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        state = state.state if isinstance(state, State) else state
+        await self._write(key, state, record[1] if record else {})
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._record(key)
+        return record[0] if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        record = await self._record(key)
+        await self._write(key, record[0] if record else None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._record(key)
+        return record[1].copy() if record else {}
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteStorage(LRUStorage):
+    """
+    FSM storage persisted to the bot database, with an LRU cache in front.
+
+    Reads are served from memory after the first database lookup of a key,
+    including lookups that found nothing. Changes are applied in memory
+    and written in one transaction `interval` seconds after the first
+    unsaved change, so close() must be awaited before the database pool
+    is closed. Data is encoded as JSON when it is set, so data that cannot
+    be serialized raises TypeError in the handler that set it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = FSM_STORAGE_SIZE,
+        ttl: float = FSM_STORAGE_TTL,
+        interval: float = FSM_FLUSH_INTERVAL
+    ):
+        super().__init__(maxsize, ttl)
+        # Unsaved changes: key -> (state, JSON data), or None to delete the key
+        self._dirty: Dict[StorageKey, Optional[Tuple[Optional[str], str]]] = {}
+        self._scheduler = FlushScheduler(interval, self._write_dirty)
+
+    async def _record(self, key: StorageKey) -> Optional[list]:
+        record = self._cached(key)
+        if record is not None:
+            return record if record[0] is not None or record[1] else None
+        if key in self._dirty:
+            # Evicted from the cache before it was saved
+            state, encoded = self._dirty[key] or (None, "{}")
+            data = json.loads(encoded)
+        else:
+            stored = await get_fsm_record(encode_key(key))
+            state, data = stored or (None, {})
+            # A change made while we were reading wins
+            record = self._cached(key)
+            if record is not None:
+                return record if record[0] is not None or record[1] else None
+        # Cached even when empty, so unknown users cost one lookup per ttl
+        self._cache(key, state, data)
+        return self._records[key] if state is not None or data else None
+
+    async def _write(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        # Encoded first, so unserializable data changes nothing
+        encoded = json.dumps(data, ensure_ascii=False)
+        self._cache(key, state, data)
+        self._dirty[key] = (state, encoded) if state is not None or data else None
+        self._scheduler.schedule()
+
+    async def _write_dirty(self) -> None:
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        try:
+            await save_fsm_records({encode_key(key): record for key, record in batch.items()})
+        except Exception as e:
+            # Keep the changes, except where a newer one was made meanwhile
+            for key, record in batch.items():
+                self._dirty.setdefault(key, record)
+            log_error(0, e, "fsm_storage_flush_error")
+            self._scheduler.schedule()
+
+    async def flush(self) -> None:
+        """Write all unsaved changes now"""
+        await self._scheduler.flush()
+
+    async def close(self) -> None:
+        """Write unsaved changes and stop scheduling flushes"""
+        await self._scheduler.stop()
+
+FSM_STORAGES = {
+    "memory": LRUStorage,
+    "sqlite": SQLiteStorage,
+}
+
+def create_fsm_storage(name: str) -> BaseStorage:
+    """Create the FSM storage selected by FSM_STORAGE in .env"""
+    if name not in FSM_STORAGES:
+        raise ValueError(f"Unknown FSM_STORAGE {name!r}, use one of: {', '.join(FSM_STORAGES)}")
+    return FSM_STORAGES[name]()
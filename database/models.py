@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 @dataclass
 class User:
@@ -21,3 +21,49 @@ class Subscription:
     start_date: datetime
     end_date: datetime
     is_active: bool = True
+    reminded_end_date: Optional[datetime] = None  # See claim_subscription_reminder
+
+@dataclass
+class BroadcastJob:
+    id: int
+    text: str
+    audience: str  # Key of the recipient query, see services.notifications.AUDIENCES
+    exclude_users: List[int]
+    status: str  # running, done or failed
+    last_user_id: int  # Checkpoint: every recipient up to this id was processed
+    total: int
+    sent: int
+    failed: int
+    excluded: int
+    created_at: datetime
+    updated_at: datetime
+    owner: Optional[str] = None  # Instance running the job, see services.notifications
+
+@dataclass
+class Payment:
+    telegram_payment_charge_id: str
+    provider_payment_charge_id: Optional[str]
+    user_id: int
+    plan_id: str
+    currency: str
+    total_amount: int
+    id: Optional[int] = None
+    subscription_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+@dataclass
+class ChatHistory:
+    user_id: int
+    role: str  # system, user or assistant
+    content: str
+    created_at: Optional[datetime] = None
+    id: Optional[int] = None
+    tokens: Optional[int] = None  # Counted once when the message is added
+
+@dataclass
+class ChannelPost:
+    channel: str
+    message_id: int
+    text: str
+    date: datetime
+    has_media: bool = False
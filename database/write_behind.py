@@ -0,0 +1,100 @@
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Optional
+
+from config.config import REFERRAL_BONUS_DAYS, REFERRAL_FLUSH_INTERVAL
+from services.logger import log_event, log_error
+from .db_operations import apply_referral_rewards
+
+
+class FlushScheduler:
+    """
+    Runs `write` once, `interval` seconds after the first schedule() call.
+
+    Shared by the write-behind buffers: schedule() after buffering a change,
+    flush() to write now, stop() on shutdown. Writes never overlap; write
+    should call schedule() again if it has to be retried.
+    """
+
+    def __init__(self, interval: float, write: Callable[[], Awaitable[None]]):
+        self.interval = interval
+        self._write = write
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._stopped = False
+
+    def schedule(self) -> None:
+        if self._flush_task is None and not self._stopped:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.interval)
+        # Cleared before flushing: stop() only ever cancels the sleep
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Run write now"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await self._write()
+
+    async def stop(self) -> None:
+        """Run write a last time and stop scheduling"""
+        self._stopped = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        # Waits for a flush already in progress, then writes the rest
+        await self.flush()
+
+
+class ReferralWriteBehind:
+    """
+    Coalesces referral rewards per referrer and writes them in batches.
+
+    The first referral after a flush schedules the next one `interval`
+    seconds later. Referrals recorded in that window cost one transaction
+    in total, with one counter update and one subscription extension per
+    referrer. Pending rewards are kept in memory until flushed, so stop()
+    must be awaited on shutdown.
+    """
+
+    def __init__(self, interval: float = REFERRAL_FLUSH_INTERVAL, bonus_days: int = REFERRAL_BONUS_DAYS):
+        self.bonus_days = bonus_days
+        self._pending: Counter = Counter()
+        self._scheduler = FlushScheduler(interval, self._write_pending)
+
+    def add(self, referrer_id: int) -> None:
+        """Record one new referral for referrer_id"""
+        self._pending[referrer_id] += 1
+        self._scheduler.schedule()
+
+    async def _write_pending(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, Counter()
+        try:
+            await apply_referral_rewards(batch, self.bonus_days)
+        except Exception as e:
+            # Keep the rewards and retry later instead of losing them
+            self._pending.update(batch)
+            log_error(0, e, "referral_flush_error")
+            self._scheduler.schedule()
+            return
+
+        for referrer_id, count in batch.items():
+            log_event(referrer_id, "referral_bonus_added", referrals=count)
+
+    async def flush(self) -> None:
+        """Write all pending rewards now"""
+        await self._scheduler.flush()
+
+    async def stop(self) -> None:
+        """Write what is pending and stop scheduling flushes"""
+        await self._scheduler.stop()
+
+
+referral_writer = ReferralWriteBehind()
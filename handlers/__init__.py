@@ -6,11 +6,24 @@ from .payments import router as payment_router
 from .channel_reader import router as channel_router
 from .onboarding import router as onboarding_router
 from .referral import router as referral_router
+from middlewares.metrics import UpdateMetricsMiddleware, HandlerMetricsMiddleware
+from middlewares.throttling import ThrottlingMiddleware
 
 def register_all_handlers(dp: Dispatcher, config):
     """
     Register all handlers in correct order
     """
+    # Metrics: update-level timing, plus per-handler timing for every event
+    # type (inner middlewares on the dispatcher apply to nested routers too)
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    # Drop update bursts per user before they are routed; throttled updates
+    # are still counted by the metrics middleware above
+    dp.update.outer_middleware(ThrottlingMiddleware())
+    handler_metrics = HandlerMetricsMiddleware()
+    for event_name, observer in dp.observers.items():
+        if event_name != "update":
+            observer.middleware(handler_metrics)
+
     dp.include_router(base_router)
     dp.include_router(onboarding_router)
     dp.include_router(profile_router)
@@ -8,9 +8,20 @@ from handlers.profile import cmd_profile as profile_command
 from handlers.subscription import cmd_subscription as subscription_command
 from datetime import datetime, timedelta
 from handlers.referral import process_referral
+from utils.templates import Template
 
 router = Router()
 
+HELP = Template(
+    "help",
+    "Available commands:",
+    "/start - 👋 Start the bot",
+    "/help - ℹ️ Show this help message",
+    "/menu - 📱 Show main menu",
+    "/profile - 👤 View your profile",
+    "/subscription - 📊 View subscription plans"
+)
+
 # Handle keyboard buttons
 @router.message(F.text == "👤 Profile")
 async def profile_button(message: Message):
@@ -42,15 +53,7 @@ async def help_button(message: Message):
 @router.message(Command("help"))
 async def cmd_help(message: Message):
     log_event(message.from_user.id, "help")
-    help_text = [
-        "Available commands:",
-        "/start - 👋 Start the bot",
-        "/help - ℹ️ Show this help message",
-        "/menu - 📱 Show main menu",
-        "/profile - 👤 View your profile",
-        "/subscription - 📊 View subscription plans"
-    ]
-    await message.answer("\n".join(help_text))
+    await message.answer(HELP.render())
 
 @router.message(Command("menu"))
 async def show_menu(message: Message):
@@ -6,20 +6,28 @@ from database.db_operations import add_user, get_user
 from keyboards.keyboards import main_kb
 from handlers.referral import process_referral
 from config.config import REFERRAL_BONUS_DAYS
+from services.bot_identity import get_bot_identity
+from utils.templates import Template
 
 router = Router()
 
-async def get_welcome_text(message: Message) -> str:
+WELCOME = Template(
+    "welcome",
+    "👋 Welcome, {full_name}!",
+    "",
+    "🎁 Invite friends and get rewards!",
+    "Your referral link: {referral_link}",
+    f"Bonus for each friend: {REFERRAL_BONUS_DAYS} days of subscription",
+    "",
+    "Use the menu below to navigate:"
+)
+
+def get_welcome_text(message: Message) -> str:
     """Generate welcome text with referral info"""
-    return "\n".join([
-        f"👋 Welcome, {message.from_user.full_name}!",
-        "",
-        "🎁 Invite friends and get rewards!",
-        f"Your referral link: t.me/{(await message.bot.me()).username}?start={message.from_user.id}",
-        f"Bonus for each friend: {REFERRAL_BONUS_DAYS} days of subscription",
-        "",
-        "Use the menu below to navigate:"
-    ])
+    return WELCOME.render(
+        full_name=message.from_user.full_name,
+        referral_link=get_bot_identity().referral_link(message.from_user.id)
+    )
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
@@ -47,7 +55,7 @@ async def cmd_start(message: Message):
                 await process_referral(user_id, referrer_id)
         
         # Show welcome text for both new and existing users
-        welcome_text = await get_welcome_text(message)
+        welcome_text = get_welcome_text(message)
         await message.answer(
             welcome_text,
             reply_markup=main_kb
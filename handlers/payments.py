@@ -1,11 +1,11 @@
-import datetime
-
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message, LabeledPrice, PreCheckoutQuery
+from aiogram.types import CallbackQuery, Message, PreCheckoutQuery
 
 from services.logger import log_event, log_error
 from config.config import SUBSCRIPTION_PLANS
-from database.db_operations import create_subscription
+from database.db_operations import record_payment
+from database.models import Payment
+from services.plans import PlanCatalog
 
 router = Router()
 
@@ -23,6 +23,8 @@ Duration: {description}
 You will be redirected to the payment page.
 """
 
+plan_catalog = PlanCatalog(SUBSCRIPTION_PLANS, PROVIDER_TOKEN, PAYMENT_MESSAGE)
+
 @router.callback_query(F.data.startswith("sub_"))
 async def send_invoice(callback: CallbackQuery):
     """
@@ -32,36 +34,17 @@ async def send_invoice(callback: CallbackQuery):
     user_id = callback.from_user.id
     try:
         log_event(user_id, "payment_start")
-        sub_type = callback.data.split("_")[1]
-        plan = SUBSCRIPTION_PLANS[sub_type]
-
-        title = plan["title"]
-        description = plan["description"]
-        payload = f"subscription_{sub_type}"
-        currency = "XTR"
-        price = plan["price"]
-
-        prices = [LabeledPrice(label="Subscription", amount=price)]
+        plan = plan_catalog.by_callback(callback.data)
+        if plan is None:
+            log_event(user_id, f"payment_unknown_plan_{callback.data}")
+            await callback.answer("This plan is no longer available", show_alert=True)
+            return
 
         # Обновляем текущее сообщение вместо его удаления
-        await callback.message.edit_text(
-            PAYMENT_MESSAGE.format(
-                title=title,
-                price=price,
-                description=description
-            )
-        )
+        await callback.message.edit_text(plan.payment_text)
         
         # Отправляем инвойс отдельным сообщением
-        await callback.bot.send_invoice(
-            chat_id=user_id,
-            title=title,
-            description=description,
-            payload=payload,
-            provider_token=PROVIDER_TOKEN,
-            currency=currency,
-            prices=prices
-        )
+        await callback.bot.send_invoice(chat_id=user_id, **plan.invoice)
         
         await callback.answer()
         
@@ -71,10 +54,22 @@ async def send_invoice(callback: CallbackQuery):
 
 @router.pre_checkout_query()
 async def process_pre_checkout_query(pre_checkout_query: PreCheckoutQuery):
-    """Answer pre-checkout query"""
+    """Accept the checkout only for a known plan at its current price"""
     user_id = pre_checkout_query.from_user.id
     try:
         log_event(user_id, "payment_pre_checkout")
+        plan = plan_catalog.validate(
+            pre_checkout_query.invoice_payload,
+            pre_checkout_query.currency,
+            pre_checkout_query.total_amount
+        )
+        if plan is None:
+            log_event(user_id, "payment_pre_checkout_rejected")
+            await pre_checkout_query.answer(
+                ok=False,
+                error_message="This plan is no longer available. Please choose a plan again."
+            )
+            return
         await pre_checkout_query.answer(ok=True)
     except Exception as e:
         log_error(user_id, e, "pre_checkout_error")
@@ -84,33 +79,40 @@ async def process_pre_checkout_query(pre_checkout_query: PreCheckoutQuery):
 async def process_successful_payment(message: Message):
     """
     Handle successful payment
-    Creates subscription in database and sends confirmation to user
+    Records the payment together with the subscription it buys and sends
+    confirmation to user. Redelivered payments are recognised by their
+    charge id and ignored.
     """
     user_id = message.from_user.id
+    payment = message.successful_payment
     try:
-        # Get subscription type from payload
-        sub_type = message.successful_payment.invoice_payload.split("_")[1]
-        plan = SUBSCRIPTION_PLANS[sub_type]
-        
-        log_event(user_id, f"payment_success_{sub_type}")
-
-        # Calculate subscription dates
-        start_date = datetime.datetime.now()
-        end_date = start_date + datetime.timedelta(days=plan["days"])
-
-        # Create subscription in database
-        await create_subscription(
-            user_id=user_id,
-            subscription_type=sub_type,
-            start_date=start_date,
-            end_date=end_date
+        # Payloads were validated at pre-checkout
+        plan = plan_catalog.by_payload(payment.invoice_payload)
+        if plan is None:
+            raise ValueError(f"Unknown invoice payload {payment.invoice_payload!r}")
+
+        subscription = await record_payment(
+            Payment(
+                telegram_payment_charge_id=payment.telegram_payment_charge_id,
+                provider_payment_charge_id=payment.provider_payment_charge_id,
+                user_id=user_id,
+                plan_id=plan.id,
+                currency=payment.currency,
+                total_amount=payment.total_amount
+            ),
+            days=plan.days
         )
+        if subscription is None:
+            log_event(user_id, "payment_duplicate", charge_id=payment.telegram_payment_charge_id)
+            return
+
+        log_event(user_id, f"payment_success_{plan.id}")
 
         # Send confirmation message
         await message.answer(
             f"Thank you for your payment!\n"
-            f"Your {plan['title']} is now active.\n"
-            f"Valid until: {end_date.strftime('%Y-%m-%d')}"
+            f"Your {plan.title} is now active.\n"
+            f"Valid until: {subscription.end_date.strftime('%Y-%m-%d')}"
         )
     except Exception as e:
         log_error(user_id, e, "payment_success_processing_error")
@@ -4,10 +4,36 @@ from aiogram.filters import Command
 from services.logger import log_event, log_error
 from database.db_operations import get_user, get_active_subscription
 from keyboards.keyboards import profile_kb
+from services.bot_identity import get_bot_identity
+from utils.templates import Template
 from datetime import datetime
 
 router = Router()
 
+PROFILE = Template(
+    "profile",
+    "👤 Your Profile:",
+    "ID: {user_id}",
+    "Name: {name}",
+    "",
+    "🤝 Referral Program:",
+    "Invited friends: {referral_count}",
+    "Your referral link: {referral_link}",
+    "",
+    "📊 Subscription Status:",
+    "{subscription}"
+)
+PROFILE_SUBSCRIPTION = Template(
+    "profile_subscription",
+    "Type: {subscription_type}",
+    "Valid until: {end_date:%Y-%m-%d}",
+    "Days left: {days_left}"
+)
+PROFILE_NO_SUBSCRIPTION = Template(
+    "profile_no_subscription",
+    "No active subscription"
+)
+
 @router.message(Command("profile"))
 async def cmd_profile(message: Message):
     """Handle /profile command"""
@@ -22,30 +48,23 @@ async def cmd_profile(message: Message):
             
         subscription = await get_active_subscription(user_id)
         
-        profile_text = [
-            "👤 Your Profile:",
-            f"ID: {user_id}",
-            f"Name: {user.name or 'Not set'}",
-            "",
-            "🤝 Referral Program:",
-            f"Invited friends: {user.referral_count}",
-            f"Your referral link: t.me/{(await message.bot.me()).username}?start={user_id}",
-            "",
-            "📊 Subscription Status:"
-        ]
-        
         if subscription:
-            days_left = (subscription.end_date - datetime.now()).days
-            profile_text.extend([
-                f"Type: {subscription.subscription_type}",
-                f"Valid until: {subscription.end_date.strftime('%Y-%m-%d')}",
-                f"Days left: {days_left}"
-            ])
+            subscription_text = PROFILE_SUBSCRIPTION.render(
+                subscription_type=subscription.subscription_type,
+                end_date=subscription.end_date,
+                days_left=(subscription.end_date - datetime.now()).days
+            )
         else:
-            profile_text.append("No active subscription")
+            subscription_text = PROFILE_NO_SUBSCRIPTION.render()
         
         await message.answer(
-            "\n".join(profile_text),
+            PROFILE.render(
+                user_id=user_id,
+                name=user.name or 'Not set',
+                referral_count=user.referral_count,
+                referral_link=get_bot_identity().referral_link(user_id),
+                subscription=subscription_text
+            ),
             reply_markup=profile_kb
         )
         
@@ -8,9 +8,42 @@ from database.db_operations import get_active_subscription
 from keyboards.keyboards import subscription_kb, profile_kb
 
 from config.config import SUBSCRIPTION_PLANS, REFERRAL_BONUS_DAYS
+from utils.templates import Template
 
 router = Router()
 
+SUBSCRIPTION_MENU = Template(
+    "subscription_menu",
+    "Enhance your experience with our subscription plans:"
+)
+SUBSCRIPTION_STATUS = Template(
+    "subscription_status",
+    "Your subscription status:",
+    "",
+    "Plan: {title}",
+    "Price: {price} stars",
+    "Valid until: {end_date:%Y-%m-%d}",
+    "Days left: {days_left}"
+)
+NO_SUBSCRIPTION = Template(
+    "no_subscription",
+    "You don't have an active subscription.",
+    "Use /subscription to view available plans."
+)
+CANCEL_INFO = Template(
+    "cancel_info",
+    "ℹ️ Subscription Cancellation",
+    "",
+    "To cancel your subscription, please contact our support:",
+    "• Email: support@example.com",
+    "• Telegram: @support_bot",
+    "",
+    "Please include your User ID in the message:",
+    "User ID: {user_id}",
+    "",
+    "Your subscription will remain active until the end date."
+)
+
 @router.message(Command("subscription"))
 async def cmd_subscription(message: Message):
     """Handle /subscription command"""
@@ -19,7 +52,7 @@ async def cmd_subscription(message: Message):
         log_event(user_id, "subscription_menu")
         
         await message.answer(
-            "Enhance your experience with our subscription plans:",
+            SUBSCRIPTION_MENU.render(),
             reply_markup=subscription_kb
         )
         
@@ -37,24 +70,20 @@ async def show_subscription_status(callback: CallbackQuery):
         subscription = await get_active_subscription(user_id)
         
         if subscription:
-            days_left = (subscription.end_date - datetime.datetime.now()).days
             plan = SUBSCRIPTION_PLANS.get(subscription.subscription_type, {})
-            price = plan.get('price', 'N/A')
             
             log_event(user_id, "subscription_status_active")
             await callback.message.answer(
-                f"Your subscription status:\n\n"
-                f"Plan: {plan.get('title', subscription.subscription_type)}\n"
-                f"Price: {price} stars\n"
-                f"Valid until: {subscription.end_date.strftime('%Y-%m-%d')}\n"
-                f"Days left: {days_left}"
+                SUBSCRIPTION_STATUS.render(
+                    title=plan.get('title', subscription.subscription_type),
+                    price=plan.get('price', 'N/A'),
+                    end_date=subscription.end_date,
+                    days_left=(subscription.end_date - datetime.datetime.now()).days
+                )
             )
         else:
             log_event(user_id, "subscription_status_inactive")
-            await callback.message.answer(
-                "You don't have an active subscription.\n"
-                "Use /subscription to view available plans."
-            )
+            await callback.message.answer(NO_SUBSCRIPTION.render())
         
         await callback.answer()
         
@@ -86,20 +115,7 @@ async def cancel_subscription(callback: CallbackQuery):
         if subscription:
             # TODO: Add subscription cancellation logic here
             log_event(user_id, "subscription_cancellation_info_shown")
-            cancel_text = [
-                "ℹ️ Subscription Cancellation",
-                "",
-                "To cancel your subscription, please contact our support:",
-                "• Email: support@example.com",
-                "• Telegram: @support_bot",
-                "",
-                "Please include your User ID in the message:",
-                f"User ID: {user_id}",
-                "",
-                "Your subscription will remain active until the end date."
-            ]
-            
-            await callback.message.answer("\n".join(cancel_text))
+            await callback.message.answer(CANCEL_INFO.render(user_id=user_id))
         else:
             log_event(user_id, "subscription_cancellation_no_active")
             await callback.message.answer(
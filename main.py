@@ -1,62 +1,148 @@
 import asyncio
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from telethon import TelegramClient
-from config.config import load_config
+from config.config import load_config, Config
 from services.logger import log_event, log_error
-from database.db_operations import init_db
+from database.db_operations import init_db, open_pool, close_pool
+from database.write_behind import referral_writer
+from database.fsm_storage import create_fsm_storage
 from handlers import register_all_handlers
-from handlers.channel_reader import set_telethon_client
+from handlers.channel_reader import set_channel_feed
+from services.channel_feed import ChannelFeed
+from services.notifications import NotificationService
+from services.expiry import ExpiryScheduler
+from services.webhook import create_app
+from services.metrics import start_metrics_server
+from services.bot_identity import set_bot_identity
 
-async def main():
-
-    config = load_config()
-    # Initialize bot and dispatcher with new syntax
-    bot = Bot(
-        token=config.bot.token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    dp = Dispatcher()
-    
+async def on_startup(dispatcher: Dispatcher, bot: Bot, config: Config):
+    """Open resources shared by handlers; runs in both polling and webhook mode"""
     # Initialize database
     try:
         await init_db()
+        await open_pool()
     except Exception as e:
         log_error(0, e, "database_init_error")
-        return
+        raise
+
     # Initialize Telethon if credentials are provided
     if config.telethon.api_id and config.telethon.api_hash:
         try:
-            client = TelegramClient('channel_reader_session', 
-                                  int(config.telethon.api_id), 
+            client = TelegramClient('channel_reader_session',
+                                  int(config.telethon.api_id),
                                   config.telethon.api_hash)
             await client.start()
-            set_telethon_client(client)
+            dispatcher["telethon_client"] = client
             log_event(0, "telethon_client_started")
+
+            # Watch channels in the background so /show_channel reads memory only
+            feed = ChannelFeed(client, config.telethon.channels)
+            await feed.start()
+            set_channel_feed(feed)
+            dispatcher["channel_feed"] = feed
         except Exception as e:
             log_error(0, e, "telethon_init_error")
-            return
-    
-    # Register handlers
-    register_all_handlers(dp, config)
-    
-    # Log bot info
+            raise
+
+    # Resolve bot info once; handlers read it from the bot identity service
     try:
         bot_info = await bot.get_me()
+        set_bot_identity(bot_info)
         log_event(0, f"bot_started_{bot_info.username}")
     except Exception as e:
         log_error(0, e, "bot_info_error")
-        return
-    
+        raise
+
+    if config.webhook.enabled:
+        await bot.set_webhook(
+            f"{config.webhook.url}{config.webhook.path}",
+            secret_token=config.webhook.secret_token,
+            allowed_updates=dispatcher.resolve_used_update_types()
+        )
+        log_event(0, "webhook_set")
+
+    if config.metrics.port:
+        dispatcher["metrics_runner"] = await start_metrics_server(
+            config.metrics.host, config.metrics.port
+        )
+        log_event(0, f"metrics_listening_{config.metrics.host}:{config.metrics.port}")
+
+    # Resume broadcasts interrupted by the previous shutdown
+    notifications = NotificationService(bot)
+    dispatcher["broadcasts_task"] = asyncio.create_task(notifications.resume_broadcasts())
+
+    expiry_scheduler = ExpiryScheduler(notifications)
+    expiry_scheduler.start()
+    dispatcher["expiry_scheduler"] = expiry_scheduler
+
+async def on_shutdown(dispatcher: Dispatcher):
+    """Release resources opened in on_startup"""
+    log_event(0, "bot_stopped")
+    broadcasts_task = dispatcher.workflow_data.get("broadcasts_task")
+    if broadcasts_task:
+        broadcasts_task.cancel()
+        await asyncio.gather(broadcasts_task, return_exceptions=True)
+
+    expiry_scheduler = dispatcher.workflow_data.get("expiry_scheduler")
+    if expiry_scheduler:
+        await expiry_scheduler.stop()
+
+    metrics_runner = dispatcher.workflow_data.get("metrics_runner")
+    if metrics_runner:
+        await metrics_runner.cleanup()
+
+    feed = dispatcher.workflow_data.get("channel_feed")
+    if feed:
+        await feed.stop()
+
+    client = dispatcher.workflow_data.get("telethon_client")
+    if client:
+        await client.disconnect()
+
+    # Write batched referral rewards and FSM states before the database closes
+    await referral_writer.stop()
+    await dispatcher.storage.close()
+    await close_pool()
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: Config):
+    """Serve updates pushed by Telegram until cancelled"""
+    runner = web.AppRunner(create_app(dp, bot, config))
+    await runner.setup()
+    try:
+        site = web.TCPSite(runner, config.webhook.host, config.webhook.port)
+        await site.start()
+        log_event(0, f"webhook_listening_{config.webhook.host}:{config.webhook.port}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+async def main():
+
+    config = load_config()
+    # Initialize bot and dispatcher with new syntax
+    bot = Bot(
+        token=config.bot.token,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    dp = Dispatcher(storage=create_fsm_storage(config.fsm.storage), config=config)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    # Register handlers
+    register_all_handlers(dp, config)
+
     try:
-        await dp.start_polling(bot)
+        if config.webhook.enabled:
+            await run_webhook(dp, bot, config)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     except Exception as e:
-        log_error(0, e, "polling_error")
+        log_error(0, e, "webhook_error" if config.webhook.enabled else "polling_error")
     finally:
-        log_event(0, "bot_stopped")
-        if config.telethon.api_id:
-            await client.disconnect()
         await bot.session.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config.config import LOG_STRUCTURED
+from services.metrics import UPDATES_IN_FLIGHT, UPDATE_SECONDS, HANDLER_SECONDS, HANDLER_TOTAL
+from services.logger import log_event
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer update middleware: in-flight gauge and total processing time"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        UPDATES_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - start, update_type)
+            UPDATES_IN_FLIGHT.dec()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware: latency and outcome of the handler that matched.
+
+    Recorded as metrics, and as a handler_done log record when logging is
+    structured; the text log format has no room for the fields.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        callback = data["handler"].callback
+        labels = (callback.__module__, callback.__name__)
+        start = time.perf_counter()
+        outcome = "exception"
+        try:
+            result = await handler(event, data)
+            outcome = "success"
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            HANDLER_SECONDS.observe(elapsed, *labels)
+            HANDLER_TOTAL.inc(*labels, outcome)
+            if LOG_STRUCTURED:
+                user = data.get("event_from_user")
+                # Sample with LOG_SAMPLE_RATES = {"handler_done": ...} if too verbose
+                log_event(
+                    user.id if user else 0,
+                    "handler_done",
+                    handler=f"{labels[0]}.{labels[1]}",
+                    latency_ms=round(elapsed * 1000, 2),
+                    outcome=outcome
+                )
@@ -0,0 +1,100 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from config.config import THROTTLE_RATE, THROTTLE_BURST, THROTTLE_COSTS, THROTTLE_SWEEP_INTERVAL
+from services.metrics import UPDATES_THROTTLED
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: per-user token buckets.
+
+    Each user gets `burst` tokens, refilled at `rate` per second. An update
+    costs 1 token, or the weight its command or button text has in
+    `costs`. Updates that cannot be paid for are dropped before routing.
+    Payment updates are never throttled.
+
+    Buckets are stored as user_id -> [tokens, last update time]. A bucket
+    that has refilled completely is the same as a new one, so such buckets
+    are dropped every `sweep_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        rate: float = THROTTLE_RATE,
+        burst: float = THROTTLE_BURST,
+        costs: Optional[Mapping[str, float]] = None,
+        sweep_interval: float = THROTTLE_SWEEP_INTERVAL
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.costs = THROTTLE_COSTS if costs is None else costs
+        self.sweep_interval = sweep_interval
+        self._buckets: Dict[int, list] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def cost(self, event: Update) -> float:
+        """Tokens an update costs; 0 for updates that must not be dropped"""
+        if event.pre_checkout_query:
+            return 0
+        message = event.message
+        if message:
+            if message.successful_payment:
+                return 0
+            text = message.text
+            if text:
+                if text in self.costs:
+                    return self.costs[text]
+                # "/cmd@bot args" -> "/cmd"
+                command = text.split(maxsplit=1)[0].split("@", 1)[0]
+                return self.costs.get(command, 1)
+        elif event.callback_query and event.callback_query.data in self.costs:
+            return self.costs[event.callback_query.data]
+        return 1
+
+    def allow(self, user_id: int, cost: float) -> bool:
+        """Take cost tokens from the user's bucket if it has them"""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            tokens = self.burst
+            bucket = self._buckets[user_id] = [tokens, now]
+        else:
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if tokens < cost:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - cost
+        return True
+
+    def sweep(self, now: float) -> None:
+        """Drop buckets that have refilled completely"""
+        refill_time = self.burst / self.rate
+        idle = [
+            user_id for user_id, (_, updated) in self._buckets.items()
+            if now - updated >= refill_time
+        ]
+        for user_id in idle:
+            del self._buckets[user_id]
+        self._next_sweep = now + self.sweep_interval
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is not None:
+            cost = self.cost(event)
+            if cost and not self.allow(user.id, cost):
+                UPDATES_THROTTLED.inc(event.event_type)
+                return None
+        return await handler(event, data)
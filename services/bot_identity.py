@@ -0,0 +1,35 @@
+from dataclasses import dataclass
+from typing import Optional
+from aiogram.types import User
+
+@dataclass(frozen=True)
+class BotIdentity:
+    """Per-bot constants resolved once from getMe on startup"""
+    id: int
+    username: str
+    mention: str
+    referral_prefix: str
+
+    def referral_link(self, user_id: int) -> str:
+        """Deep link that starts the bot with user_id as referrer"""
+        return f"{self.referral_prefix}{user_id}"
+
+# Global bot identity, set on startup
+bot_identity: Optional[BotIdentity] = None
+
+def set_bot_identity(me: User) -> BotIdentity:
+    """Set global bot identity from the result of bot.get_me()"""
+    global bot_identity
+    bot_identity = BotIdentity(
+        id=me.id,
+        username=me.username,
+        mention=f"@{me.username}",
+        referral_prefix=f"t.me/{me.username}?start="
+    )
+    return bot_identity
+
+def get_bot_identity() -> BotIdentity:
+    """Get global bot identity"""
+    if bot_identity is None:
+        raise RuntimeError("Bot identity is not set, call set_bot_identity() on startup")
+    return bot_identity
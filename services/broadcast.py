@@ -0,0 +1,200 @@
+import asyncio
+import random
+import time
+from typing import AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from config.config import (
+    BROADCAST_RATE,
+    BROADCAST_PER_CHAT_INTERVAL,
+    BROADCAST_WORKERS,
+    BROADCAST_MAX_RETRIES,
+    BROADCAST_BATCH_SIZE,
+)
+from services.logger import log_event, log_error
+
+Batches = Union[Iterable[List[int]], AsyncIterable[List[int]]]
+BatchCallback = Callable[[List[int], dict], Awaitable[None]]
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatRateLimiter:
+    """Enforces a minimum interval between messages to the same chat"""
+
+    def __init__(self, interval: float, max_chats: int = 10000):
+        self.interval = interval
+        self.max_chats = max_chats
+        self._next_allowed: Dict[int, float] = {}
+
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+        next_allowed = self._next_allowed.get(chat_id, now)
+        self._next_allowed[chat_id] = max(now, next_allowed) + self.interval
+        if len(self._next_allowed) > self.max_chats:
+            self._prune(now)
+        if next_allowed > now:
+            await asyncio.sleep(next_allowed - now)
+
+    def _prune(self, now: float) -> None:
+        self._next_allowed = {
+            chat_id: moment
+            for chat_id, moment in self._next_allowed.items()
+            if moment > now
+        }
+
+
+class BroadcastEngine:
+    """
+    Sends messages to many chats concurrently within Telegram rate limits.
+
+    A global token bucket caps messages per second, a per-chat limiter keeps
+    repeated messages to one chat apart, and a flood-wait reported by
+    Telegram (TelegramRetryAfter) pauses every worker until it expires.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        rate: float = BROADCAST_RATE,
+        per_chat_interval: float = BROADCAST_PER_CHAT_INTERVAL,
+        workers: int = BROADCAST_WORKERS,
+        max_retries: int = BROADCAST_MAX_RETRIES,
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+        self.chat_limiter = ChatRateLimiter(per_chat_interval)
+        self._paused_until = 0.0
+
+    async def _wait_for_pause(self) -> None:
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Stop all workers for the given number of seconds"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def send(self, chat_id: int, text: str) -> bool:
+        """
+        Send one message, retrying flood-waits and transient errors
+
+        Returns:
+            True if the message was delivered
+        """
+        attempt = 0
+        while True:
+            await self._wait_for_pause()
+            await self.chat_limiter.wait(chat_id)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                return True
+            except TelegramRetryAfter as e:
+                # Flood-wait applies to the whole bot, not just this chat
+                self.pause(e.retry_after)
+                log_event(0, f"broadcast_paused_{e.retry_after}s")
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest):
+                # Blocked by user, chat not found and similar: retrying won't help
+                return False
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    log_error(chat_id, e, "broadcast_send_error")
+                    return False
+                await asyncio.sleep(2 ** (attempt - 1) + random.random())
+            except Exception as e:
+                log_error(chat_id, e, "broadcast_send_error")
+                return False
+
+    async def _send_batch(self, batch: List[int], text: str, stats: dict) -> None:
+        chat_ids = iter(batch)
+
+        async def worker():
+            for chat_id in chat_ids:
+                if await self.send(chat_id, text):
+                    stats["sent"] += 1
+                else:
+                    stats["failed"] += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(batch)))))
+
+    async def run(
+        self,
+        batches: Batches,
+        text: str,
+        on_batch: Optional[BatchCallback] = None,
+    ) -> dict:
+        """
+        Send text to every chat in batches
+
+        Batches are sent one after another, each by up to `workers`
+        concurrent senders.
+
+        Args:
+            batches: Iterable or async iterable of chat id lists
+            text: Message text to send
+            on_batch: Awaited with the batch and running stats once
+                every chat in the batch has been processed
+
+        Returns:
+            dict with statistics about sending results
+        """
+        stats = {"total": 0, "sent": 0, "failed": 0}
+
+        async def process(batch):
+            stats["total"] += len(batch)
+            await self._send_batch(batch, text, stats)
+            if on_batch is not None:
+                await on_batch(batch, stats)
+
+        if hasattr(batches, "__aiter__"):
+            async for batch in batches:
+                await process(batch)
+        else:
+            for batch in batches:
+                await process(batch)
+
+        return stats
+
+
+def chunked(items: List[int], size: int = BROADCAST_BATCH_SIZE) -> Iterable[List[int]]:
+    """Split a list into consecutive chunks of at most size items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,144 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from telethon import TelegramClient, events, utils
+from telethon.tl.functions.messages import GetHistoryRequest
+
+from config.config import CHANNEL_FEED_SIZE
+from database.db_operations import save_channel_posts, get_channel_posts
+from database.models import ChannelPost
+from services.logger import log_event, log_error
+
+POSTS_PER_REQUEST = 5
+
+
+def format_posts(posts: List[ChannelPost], channel_username: str) -> str:
+    """Format posts for display"""
+    formatted = [f"📱 Latest posts from {channel_username}:"]
+
+    for post in posts:
+        # Limit text length
+        text = post.text[:300] + "..." if len(post.text) > 300 else post.text
+        date = post.date.strftime("%Y-%m-%d %H:%M")
+
+        formatted.append(f"\n📝 Post from {date}")
+        formatted.append(f"{text}\n")
+
+        if post.has_media:
+            formatted.append("🖼 [Post contains media]\n")
+
+        formatted.append("-" * 30)
+
+    return "\n".join(formatted)
+
+
+def to_channel_post(channel: str, message) -> ChannelPost:
+    """Convert a Telethon message to a ChannelPost"""
+    return ChannelPost(
+        channel=channel,
+        message_id=message.id,
+        text=message.message,
+        date=message.date,
+        has_media=bool(message.media)
+    )
+
+
+class ChannelFeed:
+    """
+    Rolling buffer of the latest posts of watched channels.
+
+    On start the buffers are warmed from SQLite plus one history request
+    for posts missed while offline, and then kept current by Telethon
+    NewMessage events, so reading posts never touches the network. The
+    Telethon account has to be subscribed to a channel to receive its updates.
+    """
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        channels: List[str],
+        size: int = CHANNEL_FEED_SIZE,
+    ):
+        self.client = client
+        self.channels = channels
+        self.size = size
+        self._posts: Dict[str, Deque[ChannelPost]] = {
+            channel: deque(maxlen=size) for channel in channels
+        }
+        self._rendered: Dict[str, Optional[str]] = {}
+        self._channel_by_peer: Dict[int, str] = {}
+
+    @property
+    def channel_username(self) -> str:
+        """Channel shown by default"""
+        return self.channels[0]
+
+    async def start(self) -> None:
+        """Warm buffers and subscribe to new posts of all watched channels"""
+        for channel in self.channels:
+            entity = await self.client.get_entity(channel)
+            self._channel_by_peer[utils.get_peer_id(entity)] = channel
+
+            posts = await get_channel_posts(channel, self.size)
+            # Catch up on posts published while the bot was down
+            newest_id = posts[-1].message_id if posts else 0
+            missed = await self._fetch_history(channel, entity, min_id=newest_id)
+            await save_channel_posts(missed, keep=self.size)
+            self._posts[channel].extend(posts + missed)
+            log_event(0, f"channel_feed_warmed_{channel}_{len(posts)}_{len(missed)}")
+
+        self.client.add_event_handler(
+            self._on_new_message,
+            events.NewMessage(chats=list(self._channel_by_peer))
+        )
+
+    async def stop(self) -> None:
+        """Stop receiving new posts"""
+        self.client.remove_event_handler(self._on_new_message)
+
+    async def _fetch_history(self, channel: str, entity, min_id: int = 0) -> List[ChannelPost]:
+        history = await self.client(GetHistoryRequest(
+            peer=entity,
+            limit=self.size,
+            offset_date=None,
+            offset_id=0,
+            max_id=0,
+            min_id=min_id,
+            add_offset=0,
+            hash=0
+        ))
+        # Skip service messages (pins, title changes), they carry no text
+        messages = [
+            m for m in history.messages
+            if m.id > min_id and getattr(m, "message", None) is not None
+        ]
+        return [to_channel_post(channel, m) for m in reversed(messages)]
+
+    async def _on_new_message(self, event) -> None:
+        channel = self._channel_by_peer.get(event.chat_id)
+        if channel is None:
+            return
+        post = to_channel_post(channel, event.message)
+        self.add_post(post)
+        try:
+            await save_channel_posts([post], keep=self.size)
+        except Exception as e:
+            log_error(0, e, "channel_post_save_error")
+
+    def add_post(self, post: ChannelPost) -> None:
+        """Append post to its channel buffer, dropping the oldest one when full"""
+        self._posts[post.channel].append(post)
+        self._rendered.pop(post.channel, None)
+
+    def get_posts(self, channel: Optional[str] = None, limit: int = POSTS_PER_REQUEST) -> List[ChannelPost]:
+        """Newest posts of channel first, the default channel if not given"""
+        buffer = self._posts.get(channel or self.channel_username, ())
+        return list(reversed(buffer))[:limit]
+
+    def get_rendered(self, channel: Optional[str] = None) -> Optional[str]:
+        """Latest posts formatted for display, or None if there are none"""
+        channel = channel or self.channel_username
+        if channel not in self._rendered:
+            posts = self.get_posts(channel)
+            self._rendered[channel] = format_posts(posts, channel) if posts else None
+        return self._rendered[channel]
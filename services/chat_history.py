@@ -0,0 +1,104 @@
+import math
+from collections import OrderedDict, deque
+from typing import Deque, List, Tuple
+
+from config.config import CHAT_HISTORY_SIZE, CHAT_HISTORY_USERS
+from database.db_operations import add_chat_message, get_chat_history, clear_chat_history
+from database.models import ChatHistory
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts are estimated without it
+    tiktoken = None
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+
+# tiktoken encoding; False once it failed to load
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # Encoding files could not be loaded, e.g. offline
+            _encoding = False
+    return _encoding or None
+
+def count_tokens(text: str) -> int:
+    """Tokens in text: exact with tiktoken installed, otherwise about 4 characters per token"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+def message_tokens(entry: ChatHistory) -> int:
+    """Tokens entry takes in a request, counted once per message"""
+    if entry.tokens is None:
+        entry.tokens = count_tokens(entry.content)
+    return entry.tokens + MESSAGE_OVERHEAD
+
+def select_context(history: List[ChatHistory], budget: int) -> Tuple[List[ChatHistory], List[ChatHistory]]:
+    """
+    Split history into the newest messages that fit budget and the older rest
+
+    Returns:
+        (kept, dropped), both oldest first
+    """
+    used = 0
+    start = len(history)
+    while start > 0:
+        tokens = message_tokens(history[start - 1])
+        if used + tokens > budget:
+            break
+        used += tokens
+        start -= 1
+    return history[start:], history[:start]
+
+class ChatHistoryStore:
+    """
+    Recent conversation messages per user, in front of the chat_history table.
+
+    Each user's latest `size` messages are kept in a ring buffer, and
+    buffers of at most `max_users` users stay in memory, least recently
+    used first out. A user's buffer is loaded from the database on first
+    access.
+    """
+
+    def __init__(self, size: int = CHAT_HISTORY_SIZE, max_users: int = CHAT_HISTORY_USERS):
+        self.size = size
+        self.max_users = max_users
+        self._buffers: "OrderedDict[int, Deque[ChatHistory]]" = OrderedDict()
+
+    async def _buffer(self, user_id: int) -> Deque[ChatHistory]:
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            history = await get_chat_history(user_id, self.size)
+            # Another coroutine may have loaded it while we waited
+            buffer = self._buffers.setdefault(user_id, deque(history, maxlen=self.size))
+            if len(self._buffers) > self.max_users:
+                self._buffers.popitem(last=False)
+        self._buffers.move_to_end(user_id)
+        return buffer
+
+    async def get(self, user_id: int) -> List[ChatHistory]:
+        """Latest messages of the user's conversation, oldest first"""
+        return list(await self._buffer(user_id))
+
+    async def add(self, user_id: int, role: str, content: str) -> ChatHistory:
+        """Append a message to the user's conversation"""
+        buffer = await self._buffer(user_id)
+        entry = ChatHistory(user_id=user_id, role=role, content=content)
+        entry.tokens = count_tokens(content)
+        await add_chat_message(entry)
+        buffer.append(entry)
+        return entry
+
+    async def clear(self, user_id: int) -> None:
+        """Forget the user's conversation"""
+        await clear_chat_history(user_id)
+        self._buffers.pop(user_id, None)
+
+chat_history = ChatHistoryStore()
@@ -0,0 +1,181 @@
+import asyncio
+import heapq
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from config.config import (
+    SUBSCRIPTION_REMINDER_DAYS,
+    SUBSCRIPTION_REMINDER_ATTEMPTS,
+    EXPIRY_CHECK_INTERVAL,
+    EXPIRY_BATCH_SIZE,
+)
+from database.db_operations import (
+    get_expiring_subscriptions,
+    deactivate_expired_subscriptions,
+    claim_subscription_reminder,
+    release_subscription_reminder,
+)
+from services.notifications import NotificationService
+from services.logger import log_event, log_error
+
+REMIND, EXPIRE = 0, 1
+
+REMINDER_TEXT = (
+    "⏳ Your subscription expires in {days} on {date}.\n"
+    "Use /subscription to renew it."
+)
+
+
+def format_days_left(end_date: datetime, now: datetime) -> str:
+    """Time left rounded up: 2 days 23 hours is "3 days", under a day is in hours"""
+    seconds = max((end_date - now).total_seconds(), 0)
+    if seconds < 86400:
+        hours = max(math.ceil(seconds / 3600), 1)
+        return f"{hours} hour" if hours == 1 else f"{hours} hours"
+    days = math.ceil(seconds / 86400)
+    return f"{days} day" if days == 1 else f"{days} days"
+
+
+class ExpiryScheduler:
+    """
+    Deactivates expired subscriptions and sends renewal reminders.
+
+    Deadlines are kept in a min-heap of (time, kind, subscription_id, ...).
+    Every `interval` seconds expired subscriptions are swept and the heap is
+    rebuilt from the subscriptions ending in the next `remind_days` plus one
+    interval, read from the (is_active, end_date) index. Rebuilding the
+    whole window picks up subscriptions created or extended since the last
+    refill, so only a small window is held in memory and nothing is missed.
+    The loop sleeps until the earliest deadline; entries are checked
+    against the database when popped, since a subscription may have been
+    extended or cancelled after it was loaded.
+    """
+
+    def __init__(
+        self,
+        notifications: NotificationService,
+        remind_days: int = SUBSCRIPTION_REMINDER_DAYS,
+        interval: float = EXPIRY_CHECK_INTERVAL,
+        batch_size: int = EXPIRY_BATCH_SIZE,
+        reminder_attempts: int = SUBSCRIPTION_REMINDER_ATTEMPTS
+    ):
+        self.notifications = notifications
+        self.remind_before = timedelta(days=remind_days)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.reminder_attempts = reminder_attempts
+        self._heap: List[Tuple[datetime, int, int, int, datetime]] = []
+        # (subscription_id, end_date) -> failed reminder sends
+        self._failed_reminders: Dict[Tuple[int, datetime], int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run(self) -> None:
+        next_refill = datetime.now()
+        while True:
+            try:
+                now = datetime.now()
+                if now >= next_refill:
+                    # Moved first, so a failing refill is retried next interval
+                    # rather than in a busy loop
+                    next_refill = now + timedelta(seconds=self.interval)
+                    await self.refill(now)
+                await self.process_due(now)
+            except Exception as e:
+                log_error(0, e, "expiry_scheduler_error")
+
+            wake_at = next_refill
+            if self._heap and self._heap[0][0] < wake_at:
+                wake_at = self._heap[0][0]
+            await asyncio.sleep(max((wake_at - datetime.now()).total_seconds(), 0))
+
+    async def refill(self, now: datetime) -> None:
+        """
+        Sweep expired subscriptions, then reload the deadlines of those
+        ending up to one interval past the reminder window
+        """
+        # Also catches up on everything that ended while the bot was down
+        await self.sweep()
+        until = now + self.remind_before + timedelta(seconds=self.interval)
+        heap = []
+        for subscription in await get_expiring_subscriptions(now, until):
+            end_date = subscription.end_date
+            entry = (subscription.id, subscription.user_id, end_date)
+            heap.append((end_date, EXPIRE) + entry)
+            if subscription.reminded_end_date != end_date:
+                heap.append((end_date - self.remind_before, REMIND) + entry)
+        heapq.heapify(heap)
+        self._heap = heap
+
+    async def process_due(self, now: datetime) -> None:
+        """Handle every deadline that has passed"""
+        reminders = []
+        expired = False
+        while self._heap and self._heap[0][0] <= now:
+            _, kind, subscription_id, user_id, end_date = heapq.heappop(self._heap)
+            if kind == EXPIRE:
+                expired = True
+            elif end_date > now:
+                reminders.append((subscription_id, user_id, end_date))
+
+        if expired:
+            await self.sweep()
+        if reminders:
+            await self.send_reminders(reminders, now)
+
+    async def sweep(self) -> None:
+        """Deactivate all subscriptions that have ended"""
+        deactivated = await deactivate_expired_subscriptions(datetime.now(), self.batch_size)
+        if deactivated:
+            log_event(0, "subscriptions_expired", count=deactivated)
+
+    async def send_reminders(self, reminders: List[Tuple[int, int, datetime]], now: datetime) -> None:
+        """
+        Remind each user once per end date; stale entries are skipped.
+
+        A reminder that was not delivered is released and loaded again by
+        the next refill, up to reminder_attempts sends. After that the
+        claim is kept, e.g. for users who blocked the bot.
+        """
+        for subscription_id, user_id, end_date in reminders:
+            # Fails if the subscription was extended, cancelled or already reminded
+            if not await claim_subscription_reminder(subscription_id, end_date):
+                continue
+            text = REMINDER_TEXT.format(
+                days=format_days_left(end_date, now),
+                date=end_date.strftime("%d.%m.%Y")
+            )
+            try:
+                stats = await self.notifications.send_notification_to_users([user_id], text)
+            except Exception as e:
+                log_error(user_id, e, "subscription_reminder_error")
+                stats = None
+
+            key = (subscription_id, end_date)
+            if stats and stats["sent"]:
+                self._failed_reminders.pop(key, None)
+                log_event(user_id, "subscription_reminder_sent", subscription_id=subscription_id)
+                continue
+
+            attempts = self._failed_reminders.get(key, 0) + 1
+            log_event(
+                user_id, "subscription_reminder_failed",
+                subscription_id=subscription_id, attempts=attempts
+            )
+            if attempts >= self.reminder_attempts:
+                self._failed_reminders.pop(key, None)
+                continue
+            self._failed_reminders[key] = attempts
+            try:
+                await release_subscription_reminder(subscription_id, end_date)
+            except Exception as e:
+                log_error(user_id, e, "subscription_reminder_error")
@@ -1,6 +1,14 @@
 from loguru import logger
+import atexit
+import json
+import queue
+import random
 import sys
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
+from config.config import LOG_STRUCTURED, LOG_BATCH_SIZE, LOG_SAMPLE_RATES
 
 # Create logs directory if it doesn't exist
 logs_dir = Path("logs")
@@ -9,11 +17,19 @@ logs_dir.mkdir(exist_ok=True)
 # Remove default handler
 logger.remove()
 
+def _json_format(record) -> str:
+    """Render a record as one JSON object per line"""
+    extra = record["extra"]
+    entry = {"time": extra["ts"].isoformat(), "level": record["level"].name}
+    entry.update((key, value) for key, value in extra.items() if key != "ts")
+    record["extra"]["_json"] = json.dumps(entry, ensure_ascii=False, default=str)
+    return "{extra[_json]}\n"
+
 # Add handler for events
 logger.add(
-    "logs/events.log",
+    "logs/events.jsonl" if LOG_STRUCTURED else "logs/events.log",
     level="INFO",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {message}",
+    format=_json_format if LOG_STRUCTURED else "{extra[ts]:%Y-%m-%d %H:%M:%S} | {message}",
     filter=lambda record: record["level"].name == "INFO",
     encoding="utf-8",
     rotation="10 MB",
@@ -22,19 +38,73 @@ logger.add(
 
 # Add handler for errors
 logger.add(
-    "logs/errors.log",
+    "logs/errors.jsonl" if LOG_STRUCTURED else "logs/errors.log",
     level="ERROR",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}\n{exception}",
+    format=_json_format if LOG_STRUCTURED else "{extra[ts]:%Y-%m-%d %H:%M:%S} | {level} | {message}\n{exception}",
     filter=lambda record: record["level"].name == "ERROR",
     encoding="utf-8",
     rotation="10 MB",
     compression="zip"
 )
 
-def log_event(user_id: int, event: str):
-    """Log user events in format: user_id | event"""
-    logger.info(f"{user_id} | {event}")
+# Records are queued by log_event/log_error and written by a background
+# thread, so formatting, disk writes and rotation never run on the event
+# loop. The timestamp is taken when the record is queued.
+_records: "queue.SimpleQueue" = queue.SimpleQueue()
+_STOP = object()
+
+def _write_records():
+    """Drain the queue in batches of up to LOG_BATCH_SIZE records"""
+    while True:
+        batch = [_records.get()]
+        try:
+            while len(batch) < LOG_BATCH_SIZE:
+                batch.append(_records.get_nowait())
+        except queue.Empty:
+            pass
+
+        for record in batch:
+            if record is _STOP:
+                return
+            level, timestamp, message, extra = record
+            try:
+                logger.bind(ts=datetime.fromtimestamp(timestamp), **extra).log(level, message)
+            except Exception as e:
+                print(f"Logging failed: {e}", file=sys.stderr)
+
+_writer = threading.Thread(target=_write_records, name="log-writer", daemon=True)
+_writer.start()
+
+@atexit.register
+def flush_logs():
+    """Write out all queued records and stop the writer thread"""
+    if _writer.is_alive():
+        _records.put(_STOP)
+        _writer.join()
+
+def _sampled_out(event: str) -> bool:
+    """Whether a high-volume event should be skipped, see LOG_SAMPLE_RATES"""
+    for prefix, rate in LOG_SAMPLE_RATES.items():
+        if event.startswith(prefix):
+            return random.random() >= rate
+    return False
+
+def log_event(user_id: int, event: str, **fields):
+    """
+    Log user events in format: user_id | event
+
+    Extra fields such as handler or latency_ms are kept as structured data
+    and appear in the JSON records.
+    """
+    if LOG_SAMPLE_RATES and _sampled_out(event):
+        return
+    fields["user_id"] = user_id
+    fields["event"] = event
+    _records.put(("INFO", time.time(), f"{user_id} | {event}", fields))
 
-def log_error(user_id: int, error: Exception, context: str = ""):
+def log_error(user_id: int, error: Exception, context: str = "", **fields):
     """Log errors with user_id and context"""
-    logger.error(f"{user_id} | {context} | {str(error)}")
+    fields["user_id"] = user_id
+    fields["event"] = context
+    fields["error"] = str(error)
+    _records.put(("ERROR", time.time(), f"{user_id} | {context} | {str(error)}", fields))
@@ -0,0 +1,174 @@
+import functools
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base class for metrics rendered in the Prometheus text format"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def time(self, *labels: str) -> Callable:
+        """Decorator observing the duration of a coroutine function"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *(labels or (func.__name__,)))
+            return wrapper
+        return decorator
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+registry: List[Metric] = []
+
+# Extra samples computed at scrape time, e.g. cache statistics
+collectors: List[Callable[[], List[str]]] = []
+
+UPDATES_IN_FLIGHT = Gauge(
+    "bot_updates_in_flight", "Updates currently being processed"
+)
+UPDATE_SECONDS = Histogram(
+    "bot_update_duration_seconds", "Time to process an update", ["update_type"]
+)
+UPDATES_THROTTLED = Counter(
+    "bot_updates_throttled_total", "Updates dropped by per-user throttling", ["update_type"]
+)
+HANDLER_SECONDS = Histogram(
+    "bot_handler_duration_seconds", "Handler latency", ["router", "handler"]
+)
+HANDLER_TOTAL = Counter(
+    "bot_handler_total", "Handler calls by outcome", ["router", "handler", "outcome"]
+)
+DB_SECONDS = Histogram(
+    "bot_db_operation_duration_seconds", "Database operation latency", ["operation"],
+    buckets=DB_BUCKETS
+)
+OPENAI_REQUESTS = Counter(
+    "bot_openai_requests_total", "OpenAI requests by cache result (hit, coalesced, miss)", ["result"]
+)
+OPENAI_RETRIES = Counter(
+    "bot_openai_retries_total", "Retried OpenAI calls by error", ["error"]
+)
+OPENAI_SECONDS = Histogram(
+    "bot_openai_request_duration_seconds", "OpenAI API call latency",
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    parts = [metric.render() for metric in registry]
+    for collector in collectors:
+        parts.extend(collector())
+    return "\n".join(parts) + "\n"
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve GET /metrics; call cleanup() on the returned runner to stop"""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -1,91 +1,162 @@
-from typing import List, Optional
-from aiogram import Bot
-from aiogram.exceptions import TelegramBadRequest
-from database.db_operations import get_active_users
 import asyncio
+import os
+import socket
+import uuid
+from datetime import timedelta
+from typing import AsyncIterator, Iterable, List, Optional
+from aiogram import Bot
+from config.config import BROADCAST_BATCH_SIZE, BROADCAST_CLAIM_TIMEOUT
+from database.db_operations import (
+    iter_active_user_ids,
+    create_broadcast_job,
+    checkpoint_broadcast_job,
+    claim_broadcast_job,
+    release_broadcast_job,
+    get_running_broadcast_jobs,
+)
+from database.models import BroadcastJob
+from services.broadcast import BroadcastEngine, chunked
+from services.logger import log_event, log_error
+
+# Recipient queries a broadcast job can target, by the key stored in the job.
+# Each yields ascending chunks of user ids after the given checkpoint.
+AUDIENCES = {
+    "active_users": iter_active_user_ids,
+}
+
+# Identifies this process as the owner of the broadcast jobs it runs
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class BroadcastClaimLost(Exception):
+    """Another instance took over the job, see claim_broadcast_job"""
 
 class NotificationService:
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, engine: Optional[BroadcastEngine] = None):
         self.bot = bot
+        self.engine = engine or BroadcastEngine(bot)
 
     async def send_mass_notification(
         self,
         text: str,
-        exclude_users: Optional[List[int]] = None,
-        delay: float = 0.05
+        exclude_users: Optional[Iterable[int]] = None
     ) -> dict:
         """
         Send notification to all active users
-        
+
+        The broadcast is stored as a job and its progress is checkpointed
+        after every batch, so it can be resumed after a restart without
+        messaging the same users again.
+
         Args:
             text: Message text to send
-            exclude_users: List of user IDs to exclude from notification
-            delay: Delay between messages in seconds to avoid flood limits
-            
+            exclude_users: User IDs to exclude from notification
+
         Returns:
             dict with statistics about sending results
         """
-        exclude_users = exclude_users or []
-        stats = {
-            "total": 0,
-            "sent": 0,
-            "failed": 0,
-            "excluded": len(exclude_users)
-        }
+        job = await create_broadcast_job(
+            text, "active_users", sorted(set(exclude_users or ())), INSTANCE_ID
+        )
+        return await self.run_job(job)
 
-        try:
-            users = await get_active_users()
-            stats["total"] = len(users)
+    async def resume_broadcasts(self, interval: float = BROADCAST_CLAIM_TIMEOUT) -> None:
+        """
+        Continue broadcast jobs interrupted by a restart, until cancelled
 
-            for user in users:
-                if user.user_id in exclude_users:
-                    continue
+        A job is resumed only after claiming it, so with several replicas
+        each job is run by one of them. Jobs released on shutdown are
+        claimed at once; jobs of a crashed instance once they have not been
+        checkpointed for BROADCAST_CLAIM_TIMEOUT.
+        """
+        stale_after = timedelta(seconds=BROADCAST_CLAIM_TIMEOUT)
+        while True:
+            try:
+                await self._resume_claimable(stale_after)
+            except Exception as e:
+                # E.g. database is locked; poll again next interval
+                log_error(0, e, "broadcast_resume_poll_error")
+            await asyncio.sleep(interval)
 
-                try:
-                    await self.bot.send_message(user.user_id, text)
-                    stats["sent"] += 1
-                except TelegramBadRequest as e:
-                    stats["failed"] += 1
-                except Exception:
-                    stats["failed"] += 1
+    async def _resume_claimable(self, stale_after: timedelta) -> None:
+        """Claim and run every running job no other instance is working on"""
+        for job in await get_running_broadcast_jobs():
+            if not await claim_broadcast_job(job, INSTANCE_ID, stale_after):
+                continue
+            log_event(0, f"broadcast_{job.id}_resumed_after_{job.last_user_id}")
+            try:
+                await self.run_job(job)
+            except Exception as e:
+                log_error(0, e, f"broadcast_{job.id}_resume_error")
 
-                await asyncio.sleep(delay)
+    async def run_job(self, job: BroadcastJob) -> dict:
+        """
+        Send a broadcast job from its last checkpoint
 
+        Users of a batch interrupted mid-way are messaged again on resume;
+        everything before the checkpoint is never re-sent.
+        """
+        excluded = set(job.exclude_users)
+        sent, failed = job.sent, job.failed
+        position = {"last_user_id": job.last_user_id}
+
+        async def batches() -> AsyncIterator[List[int]]:
+            user_ids = AUDIENCES[job.audience]
+            async for chunk in user_ids(BROADCAST_BATCH_SIZE, after_user_id=job.last_user_id):
+                position["last_user_id"] = chunk[-1]
+                job.total += len(chunk)
+                if excluded:
+                    batch = [user_id for user_id in chunk if user_id not in excluded]
+                    job.excluded += len(chunk) - len(batch)
+                else:
+                    batch = chunk
+                # Yielded even when empty so the checkpoint still advances
+                yield batch
+
+        async def checkpoint(batch: List[int], stats: dict) -> None:
+            job.last_user_id = position["last_user_id"]
+            job.sent = sent + stats["sent"]
+            job.failed = failed + stats["failed"]
+            if not await checkpoint_broadcast_job(job):
+                raise BroadcastClaimLost(job.id)
+
+        try:
+            await self.engine.run(batches(), job.text, on_batch=checkpoint)
+        except asyncio.CancelledError:
+            # Shutting down: keep the job running and let the next instance
+            # that starts (or another replica) resume it right away
+            await asyncio.shield(release_broadcast_job(job))
+            raise
+        except BroadcastClaimLost:
+            log_event(0, f"broadcast_{job.id}_taken_over")
+            raise
         except Exception:
+            job.status = "failed"
+            await checkpoint_broadcast_job(job)
             raise
 
-        return stats
+        job.status = "done"
+        await checkpoint_broadcast_job(job)
+        log_event(0, f"broadcast_{job.id}_done")
+        return {
+            "total": job.total,
+            "sent": job.sent,
+            "failed": job.failed,
+            "excluded": job.excluded
+        }
 
     async def send_notification_to_users(
         self,
         user_ids: List[int],
-        text: str,
-        delay: float = 0.05
+        text: str
     ) -> dict:
         """
         Send notification to specific users
-        
+
         Args:
             user_ids: List of user IDs to send notification to
             text: Message text to send
-            delay: Delay between messages in seconds
-            
+
         Returns:
             dict with statistics about sending results
         """
-        stats = {
-            "total": len(user_ids),
-            "sent": 0,
-            "failed": 0
-        }
-
-        for user_id in user_ids:
-            try:
-                await self.bot.send_message(user_id, text)
-                stats["sent"] += 1
-            except Exception:
-                stats["failed"] += 1
-
-            await asyncio.sleep(delay)
-
-        return stats 
\ No newline at end of file
+        return await self.engine.run(chunked(user_ids), text)
@@ -1,36 +1,367 @@
-from openai import AsyncOpenAI
-from config.config import Config
+import asyncio
+import hashlib
+import json
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from config.config import (
+    OpenAIConfig,
+    OPENAI_EDIT_INTERVAL,
+    OPENAI_CONTEXT_TOKENS,
+    OPENAI_SUMMARIZE_HISTORY,
+    OPENAI_SUMMARY_TOKENS,
+    CHAT_HISTORY_USERS,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_USER_CONCURRENCY,
+    OPENAI_TIMEOUT,
+    OPENAI_MAX_RETRIES,
+    OPENAI_CACHE_SIZE,
+    OPENAI_CACHE_TTL,
+)
 from database.models import ChatHistory
-from typing import List
-import logging
+from services.chat_history import count_tokens, select_context, MESSAGE_OVERHEAD
+from services.logger import log_event, log_error
+from services.metrics import OPENAI_REQUESTS, OPENAI_RETRIES, OPENAI_SECONDS
+from utils.cache import TTLCache, MISSING
+
+# Telegram rejects longer message texts
+MAX_MESSAGE_LENGTH = 4096
 
-logger = logging.getLogger(__name__)
+SUMMARY_PROMPT = (
+    "Summarize the conversation below in a few sentences, keeping facts "
+    "the assistant may need later."
+)
+
+def cache_key(model: str, messages: List[dict]) -> str:
+    """Hash of the request, ignoring whitespace differences in message texts"""
+    normalized = [
+        (message["role"], " ".join(message["content"].split())) for message in messages
+    ]
+    data = json.dumps([model, normalized], ensure_ascii=False)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+def retry_after(error: RateLimitError) -> Optional[float]:
+    """Seconds the API asked us to wait before retrying, if it said so"""
+    headers = error.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
 
 class OpenAIService:
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
-    
-    def create_messages_from_history(self, history: List[ChatHistory]) -> List[dict]:
-        """Convert chat history to OpenAI messages format"""
-        messages = [{"role": "system", "content": Config.SYSTEM_MESSAGE}]
-        
-        for entry in history:
+    """
+    OpenAI chat completions with limits suited to a shared bot.
+
+    At most max_concurrency requests run at once, and at most
+    user_concurrency per user; requests without a user_id only count
+    toward the global limit. Identical requests in flight share one API
+    call, and completed responses are cached by a hash of the normalized
+    messages. Rate limits, timeouts and server errors are retried with
+    jittered exponential backoff, waiting at least as long as a 429
+    response's retry-after.
+    """
+
+    def __init__(
+        self,
+        config: OpenAIConfig,
+        context_tokens: int = OPENAI_CONTEXT_TOKENS,
+        summarize: bool = OPENAI_SUMMARIZE_HISTORY,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+        user_concurrency: int = OPENAI_USER_CONCURRENCY,
+        max_retries: int = OPENAI_MAX_RETRIES
+    ):
+        self.config = config
+        # Retries are done here so they share the concurrency limits
+        self.client = AsyncOpenAI(
+            api_key=config.api_key,
+            base_url=config.base_url,
+            timeout=OPENAI_TIMEOUT,
+            max_retries=0,
+        )
+        self.max_retries = max_retries
+        self.user_concurrency = user_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # user_id -> [semaphore, number of requests holding or waiting for it]
+        self._user_slots: Dict[int, list] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.cache = TTLCache(maxsize=OPENAI_CACHE_SIZE, ttl=OPENAI_CACHE_TTL)
+        self.context_tokens = context_tokens
+        self.summarize = summarize
+        self._system_tokens = count_tokens(config.system_message) + MESSAGE_OVERHEAD
+        # user_id -> (id of the last summarized message, summary)
+        self._summaries = TTLCache(maxsize=CHAT_HISTORY_USERS, ttl=24 * 3600)
+
+    def create_messages_from_history(
+        self,
+        history: List[ChatHistory],
+        summary: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Convert chat history to OpenAI messages format
+
+        Only the newest messages that fit the context token budget are
+        included; summary, if given, stands in for the older ones.
+        """
+        messages = [{"role": "system", "content": self.config.system_message}]
+        budget = self.context_tokens - self._system_tokens
+        if summary:
+            messages.append({"role": "system", "content": f"Earlier conversation: {summary}"})
+            budget -= count_tokens(summary) + MESSAGE_OVERHEAD
+
+        kept, _ = select_context(history, budget)
+        for entry in kept:
             messages.append({
                 "role": entry.role,
                 "content": entry.content
             })
-        
+
         return messages
-    
-    async def get_response(self, messages: List[dict]) -> str:
+
+    async def build_context(self, user_id: int, history: List[ChatHistory]) -> List[dict]:
+        """
+        Messages for a request continuing the user's conversation
+
+        With summarization enabled, turns that no longer fit the budget are
+        folded into a rolling per-user summary; each turn is summarized
+        once, together with the previous summary.
+        """
+        if not self.summarize:
+            return self.create_messages_from_history(history)
+
+        budget = self.context_tokens - self._system_tokens - OPENAI_SUMMARY_TOKENS - MESSAGE_OVERHEAD
+        _, dropped = select_context(history, budget)
+        summarized_id, summary = self._summaries.get(user_id, (0, None))
+        new_turns = [entry for entry in dropped if entry.id is None or entry.id > summarized_id]
+        if new_turns:
+            summary = await self.summarize_history(new_turns, summary, user_id)
+            self._summaries.set(user_id, (new_turns[-1].id or summarized_id, summary))
+        return self.create_messages_from_history(history[len(dropped):], summary)
+
+    async def summarize_history(
+        self,
+        history: List[ChatHistory],
+        previous: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> str:
+        """Short summary of history, continuing a previous summary"""
+        transcript = "\n".join(f"{entry.role}: {entry.content}" for entry in history)
+        if previous:
+            transcript = f"Summary so far: {previous}\n{transcript}"
+        response = await self._create(
+            user_id,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+            temperature=0.3,
+            max_tokens=OPENAI_SUMMARY_TOKENS,
+        )
+        return response.choices[0].message.content
+
+    @asynccontextmanager
+    async def _slot(self, user_id: Optional[int]):
+        """Hold a global and, if user_id is given, a per-user concurrency slot"""
+        if user_id is None:
+            async with self._slots:
+                yield
+            return
+        entry = self._user_slots.get(user_id)
+        if entry is None:
+            entry = self._user_slots[user_id] = [asyncio.Semaphore(self.user_concurrency), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_slots[user_id]
+
+    async def _retrying(self, user_id: Optional[int], request: Callable[[], Awaitable]):
+        """Await request(), retrying transient API errors with jittered backoff"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await request()
+            except (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, 2 ** attempt)
+                if isinstance(e, RateLimitError):
+                    delay = max(delay, retry_after(e) or 0)
+                OPENAI_RETRIES.inc(type(e).__name__)
+                log_event(user_id or 0, "openai_retry", error=type(e).__name__, delay=round(delay, 2))
+                await asyncio.sleep(delay)
+
+    async def _create(self, user_id: Optional[int], **params):
+        """Call the completions API within the limits; slots are released between retries"""
+        async def request():
+            async with self._slot(user_id):
+                start = time.perf_counter()
+                try:
+                    return await self.client.chat.completions.create(
+                        model=self.config.model, **params
+                    )
+                finally:
+                    OPENAI_SECONDS.observe(time.perf_counter() - start)
+
+        return await self._retrying(user_id, request)
+
+    async def complete(self, messages: List[dict], user_id: Optional[int] = None) -> str:
+        """
+        Response text for messages, from the cache when possible
+
+        Raises the last API error if all retries fail.
+        """
+        key = cache_key(self.config.model, messages)
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            OPENAI_REQUESTS.inc("hit")
+            return cached
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            OPENAI_REQUESTS.inc("coalesced")
+            # Shielded: a cancelled follower must not cancel the shared call
+            return await asyncio.shield(in_flight)
+
+        OPENAI_REQUESTS.inc("miss")
+        future = self._in_flight[key] = asyncio.ensure_future(self._complete(key, messages, user_id))
+        return await asyncio.shield(future)
+
+    async def _complete(self, key: str, messages: List[dict], user_id: Optional[int]) -> str:
+        try:
+            response = await self._create(user_id, messages=messages, temperature=0.7)
+            text = response.choices[0].message.content
+            self.cache.set(key, text)
+            return text
+        finally:
+            del self._in_flight[key]
+
+    async def get_response(self, messages: List[dict], user_id: Optional[int] = None) -> str:
         """Get response from OpenAI"""
         try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                temperature=0.7,
-            )
-            return response.choices[0].message.content
+            return await self.complete(messages, user_id)
         except Exception as e:
-            logger.error(f"OpenAI API error: {str(e)}")
+            log_error(user_id or 0, e, "openai_error")
             return f"Error getting OpenAI response: {str(e)}"
+
+    async def stream_response(
+        self,
+        messages: List[dict],
+        user_id: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield the response text in chunks as the model produces them
+
+        A cached response is yielded whole. Streams are not coalesced; a
+        completed stream is cached for later requests.
+        """
+        key = cache_key(self.config.model, messages)
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            OPENAI_REQUESTS.inc("hit")
+            yield cached
+            return
+
+        OPENAI_REQUESTS.inc("miss")
+        # Retries cover opening the stream; the slots are held while it is read
+        async with self._slot(user_id):
+            stream = await self._retrying(
+                user_id,
+                lambda: self.client.chat.completions.create(
+                    model=self.config.model,
+                    messages=messages,
+                    temperature=0.7,
+                    stream=True,
+                )
+            )
+            parts = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+        self.cache.set(key, "".join(parts))
+
+    async def reply_streaming(
+        self,
+        placeholder: Message,
+        messages: List[dict],
+        user_id: Optional[int] = None
+    ) -> str:
+        """
+        Stream the response into placeholder, a message already sent by the bot
+
+        Returns:
+            Full response text
+        """
+        try:
+            return await edit_progressively(placeholder, self.stream_response(messages, user_id))
+        except Exception as e:
+            log_error(placeholder.chat.id, e, "openai_stream_error")
+            text = f"Error getting OpenAI response: {str(e)}"
+            await placeholder.edit_text(text, parse_mode=None)
+            return text
+
+async def edit_progressively(
+    message: Message,
+    chunks: AsyncIterator[str],
+    interval: float = OPENAI_EDIT_INTERVAL
+) -> str:
+    """
+    Show text arriving in chunks by editing message
+
+    The first chunk is shown as soon as it arrives; after that the message
+    is edited at most once per interval, plus a final edit with the
+    complete text. Text past Telegram's length limit is cut off.
+
+    Returns:
+        Full text
+    """
+    text = ""
+    shown = ""
+    next_edit_at = 0.0
+
+    async def edit(final: bool) -> None:
+        nonlocal shown, next_edit_at
+        visible = text[:MAX_MESSAGE_LENGTH]
+        if not visible.strip() or visible == shown:
+            return
+        if final:
+            # Respect the edit rate and any flood wait before the last edit
+            await asyncio.sleep(max(next_edit_at - time.monotonic(), 0))
+        try:
+            # Model output is not HTML; send it as plain text
+            await message.edit_text(visible, parse_mode=None)
+            shown = visible
+            next_edit_at = time.monotonic() + interval
+        except TelegramRetryAfter as e:
+            next_edit_at = time.monotonic() + e.retry_after
+            if final:
+                await edit(final)
+        except TelegramBadRequest as e:
+            # Same text as before; nothing to update
+            if "message is not modified" not in str(e):
+                raise
+
+    async for chunk in chunks:
+        text += chunk
+        if time.monotonic() >= next_edit_at:
+            await edit(final=False)
+    await edit(final=True)
+    return text
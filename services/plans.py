@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Tuple
+from aiogram.types import LabeledPrice
+
+# Invoice payloads are "s:<plan_id>"; "subscription_<plan_id>" is still
+# accepted for invoices sent before the short form was introduced
+PAYLOAD_PREFIX = "s:"
+LEGACY_PAYLOAD_PREFIX = "subscription_"
+CALLBACK_PREFIX = "sub_"
+CURRENCY = "XTR"
+
+@dataclass(frozen=True)
+class Plan:
+    """A purchasable subscription plan with everything an invoice needs"""
+    __slots__ = (
+        "id", "title", "description", "price", "days",
+        "payload", "callback_data", "prices", "payment_text", "invoice",
+    )
+    id: str
+    title: str
+    description: str
+    price: int
+    days: int
+    payload: str
+    callback_data: str
+    prices: Tuple[LabeledPrice, ...]
+    payment_text: str
+    # Keyword arguments for bot.send_invoice, without chat_id
+    invoice: Mapping[str, Any]
+
+class PlanCatalog:
+    """
+    Paid plans from SUBSCRIPTION_PLANS, built once.
+
+    Lookups by callback data and by invoice payload are single dict
+    reads; anything not in the catalog is rejected.
+    """
+
+    def __init__(self, plans: Mapping[str, dict], provider_token: str, payment_message: str):
+        self.plans: Dict[str, Plan] = {}
+        self._by_callback: Dict[str, Plan] = {}
+        self._by_payload: Dict[str, Plan] = {}
+
+        for plan_id, data in plans.items():
+            if data.get("is_referral"):
+                continue
+            payload = f"{PAYLOAD_PREFIX}{plan_id}"
+            prices = (LabeledPrice(label="Subscription", amount=data["price"]),)
+            plan = Plan(
+                id=plan_id,
+                title=data["title"],
+                description=data["description"],
+                price=data["price"],
+                days=data["days"],
+                payload=payload,
+                callback_data=f"{CALLBACK_PREFIX}{plan_id}",
+                prices=prices,
+                payment_text=payment_message.format(
+                    title=data["title"],
+                    price=data["price"],
+                    description=data["description"]
+                ),
+                invoice={
+                    "title": data["title"],
+                    "description": data["description"],
+                    "payload": payload,
+                    "provider_token": provider_token,
+                    "currency": CURRENCY,
+                    "prices": list(prices),
+                },
+            )
+            self.plans[plan_id] = plan
+            self._by_callback[plan.callback_data] = plan
+            self._by_payload[payload] = plan
+            self._by_payload[f"{LEGACY_PAYLOAD_PREFIX}{plan_id}"] = plan
+
+    def by_callback(self, callback_data: str) -> Optional[Plan]:
+        """Plan selected by a subscription keyboard button"""
+        return self._by_callback.get(callback_data)
+
+    def by_payload(self, payload: str) -> Optional[Plan]:
+        """Plan an invoice payload was issued for"""
+        return self._by_payload.get(payload)
+
+    def validate(self, payload: str, currency: str, total_amount: int) -> Optional[Plan]:
+        """Plan for the payload if the currency and amount match its price"""
+        plan = self._by_payload.get(payload)
+        if plan is None or currency != CURRENCY or total_amount != plan.price:
+            return None
+        return plan
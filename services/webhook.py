@@ -0,0 +1,27 @@
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config.config import Config
+from database.db_operations import pool
+
+async def health(request: web.Request) -> web.Response:
+    """Liveness probe for load balancers"""
+    status = "ok" if pool.is_open else "starting"
+    return web.json_response({"status": status}, status=200 if pool.is_open else 503)
+
+def create_app(dp: Dispatcher, bot: Bot, config: Config) -> web.Application:
+    """
+    Build the aiohttp application serving webhook updates
+
+    Dispatcher startup and shutdown hooks run with the application, so the
+    same app can be driven from tests by POSTing updates to the webhook path.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.webhook.secret_token
+    ).register(app, path=config.webhook.path)
+    app.router.add_get("/health", health)
+    setup_application(app, dp, bot=bot)
+    return app
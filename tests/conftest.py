@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+import pytest
+
+
+def pytest_sessionstart(session):
+    """
+    Run the suite from a scratch directory
+
+    services.logger opens logs/ and database.db_operations creates data/
+    relative to the working directory when they are imported, which
+    happens while test modules are collected after this hook.
+    """
+    os.chdir(tempfile.mkdtemp(prefix="bot_tests_"))
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Fresh database file and pool under a temporary data/ directory"""
+    from database import db_operations
+    from database.connection import ConnectionPool
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    path = data_dir / "bot.db"
+    monkeypatch.setattr(db_operations, "DATABASE_PATH", path)
+    monkeypatch.setattr(db_operations, "pool", ConnectionPool(path, readers=2))
+    db_operations.user_cache.clear()
+    db_operations.subscription_cache.clear()
+    yield db_operations
+    db_operations.user_cache.clear()
+    db_operations.subscription_cache.clear()
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from config.config import REFERRAL_BONUS_DAYS
+from database.write_behind import ReferralWriteBehind
+from handlers import referral
+
+
+def run(database, scenario):
+    """Run scenario() with the database initialized and the pool open"""
+    async def main():
+        await database.init_db()
+        await database.open_pool()
+        try:
+            return await scenario()
+        finally:
+            await database.close_pool()
+    return asyncio.run(main())
+
+
+async def active_subscriptions(database, user_id):
+    async with database.pool.reader() as db:
+        async with db.execute(
+            "SELECT end_date FROM subscriptions WHERE user_id = ? AND is_active = TRUE",
+            (user_id,)
+        ) as cursor:
+            return [datetime.fromisoformat(row[0]) for row in await cursor.fetchall()]
+
+
+def test_concurrent_referrals_to_one_referrer(database, monkeypatch):
+    referrals = 300
+    referrer_id = 1
+    writer = ReferralWriteBehind(interval=60)
+    monkeypatch.setattr(referral, "referral_writer", writer)
+
+    async def scenario():
+        await database.add_user(referrer_id, "referrer", "Referrer")
+        started = datetime.now()
+        await asyncio.gather(*(
+            referral.process_referral(user_id, referrer_id)
+            for user_id in range(2, referrals + 2)
+        ))
+        await writer.flush()
+        await writer.stop()
+
+        user = await database.get_user(referrer_id)
+        end_dates = await active_subscriptions(database, referrer_id)
+        return started, user, end_dates
+
+    started, user, end_dates = run(database, scenario)
+
+    assert user.referral_count == referrals
+    assert len(end_dates) == 1
+    granted = end_dates[0] - started
+    expected = timedelta(days=referrals * REFERRAL_BONUS_DAYS)
+    assert expected <= granted < expected + timedelta(minutes=1)
+
+
+def test_concurrent_create_subscription_keeps_one_active_row(database):
+    calls = 50
+    user_id = 1
+
+    async def scenario():
+        await database.add_user(user_id, "user", "User")
+        started = datetime.now()
+        await asyncio.gather(*(
+            database.create_subscription(
+                user_id, "1month", started, started + timedelta(days=30)
+            )
+            for _ in range(calls)
+        ))
+        return started, await active_subscriptions(database, user_id)
+
+    started, end_dates = run(database, scenario)
+
+    assert len(end_dates) == 1
+    assert end_dates[0] == started + timedelta(days=30 * calls)
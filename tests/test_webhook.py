@@ -0,0 +1,126 @@
+import asyncio
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, SendMessage, SetWebhook
+from aiogram.types import Chat, Message, User
+from aiohttp.test_utils import TestClient, TestServer
+
+import main
+from config.config import (
+    Config, BotConfig, TelethonConfig, WebhookConfig, MetricsConfig, OpenAIConfig, FSMConfig
+)
+from database.write_behind import ReferralWriteBehind
+from handlers import register_all_handlers
+from services import webhook
+
+SECRET = "test-secret"
+BOT_USER = User(id=42, is_bot=True, first_name="Bot", username="test_bot")
+
+
+class StubSession(BaseSession):
+    """Bot session answering API calls locally and recording them"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        if isinstance(method, GetMe):
+            return BOT_USER
+        if isinstance(method, SendMessage):
+            return Message(
+                message_id=len(self.requests),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                from_user=BOT_USER,
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def make_config() -> Config:
+    return Config(
+        bot=BotConfig(token="42:TEST"),
+        telethon=TelethonConfig(api_id=None, api_hash=None, channel_username="@telegram"),
+        webhook=WebhookConfig(
+            url="https://bot.example.com", path="/webhook", host="127.0.0.1", port=0,
+            secret_token=SECRET
+        ),
+        metrics=MetricsConfig(host="127.0.0.1", port=0),
+        openai=OpenAIConfig(api_key=None, base_url=None, model="gpt-4o", system_message=""),
+        fsm=FSMConfig(storage="memory"),
+    )
+
+
+def start_update(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(datetime.now().timestamp()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+async def sent_messages(session: StubSession, count: int, timeout: float = 5) -> list:
+    """SendMessage calls, once at least count of them were made"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        sent = [method for method in session.requests if isinstance(method, SendMessage)]
+        if len(sent) >= count or loop.time() > deadline:
+            return sent
+        await asyncio.sleep(0.01)
+
+
+def test_webhook_app_handles_posted_updates(database, monkeypatch):
+    monkeypatch.setattr(webhook, "pool", database.pool)
+    monkeypatch.setattr(main, "referral_writer", ReferralWriteBehind())
+    config = make_config()
+    session = StubSession()
+    bot = Bot(token=config.bot.token, session=session)
+    dp = Dispatcher(config=config)
+    dp.startup.register(main.on_startup)
+    dp.shutdown.register(main.on_shutdown)
+    register_all_handlers(dp, config)
+
+    async def scenario():
+        async with TestClient(TestServer(webhook.create_app(dp, bot, config))) as client:
+            health = await client.get("/health")
+            assert health.status == 200
+            assert await health.json() == {"status": "ok"}
+
+            rejected = await client.post("/webhook", json=start_update(1, 100))
+            assert rejected.status == 401
+
+            response = await client.post(
+                "/webhook",
+                json=start_update(2, 100),
+                headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+            )
+            assert response.status == 200
+            sent = await sent_messages(session, 1)
+            user = await database.get_user(100)
+        return sent, user
+
+    sent, user = asyncio.run(scenario())
+
+    set_webhook = [method for method in session.requests if isinstance(method, SetWebhook)]
+    assert [method.url for method in set_webhook] == ["https://bot.example.com/webhook"]
+    assert len(sent) == 1
+    assert sent[0].chat_id == 100
+    assert sent[0].text.startswith("👋 Welcome, Test!")
+    assert user is not None
@@ -0,0 +1,209 @@
+"""
+Bulk import and export of the users and subscriptions tables.
+
+Rows are streamed in chunks in both directions, so memory use does not
+depend on table size. The format is taken from the file extension
+(.csv or .jsonl).
+
+    python tools/bulk_io.py export users users.csv
+    python tools/bulk_io.py import users users.csv --on-conflict replace
+
+Imported rows are matched to existing ones by NATURAL_KEYS, not by id:
+ids are local to a database and are assigned anew on import.
+
+Rows imported while the bot is running may be served stale from its
+read cache for up to DB_CACHE_TTL seconds.
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+TABLES = {
+    "users": [
+        "id", "user_id", "username", "name", "created_at",
+        "is_active", "referrer_id", "referral_count",
+    ],
+    "subscriptions": [
+        "id", "user_id", "subscription_type", "start_date", "end_date", "is_active",
+    ],
+}
+
+# Columns identifying the same row in another database. Only users.user_id
+# is UNIQUE in the schema; a subscription is identified by its user and start
+NATURAL_KEYS = {
+    "users": ["user_id"],
+    "subscriptions": ["user_id", "start_date"],
+}
+
+def connect_to_db(db_path: Path):
+    """Connect to the database"""
+    if not db_path.exists():
+        print(f"Database not found at {db_path}", file=sys.stderr)
+        return None
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA cache_size = -64000")
+    return conn
+
+def file_format(path: Path) -> str:
+    """csv or jsonl, from the file extension"""
+    suffix = path.suffix.lower()
+    if suffix not in (".csv", ".jsonl"):
+        raise ValueError(f"Unsupported file type {suffix!r}, use .csv or .jsonl")
+    return suffix[1:]
+
+class Progress:
+    """Prints row counts and throughput to stderr"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.rows = 0
+        self.written = None
+        self.started = time.monotonic()
+
+    def update(self, rows: int, written: int = None):
+        self.rows += rows
+        if written is not None:
+            self.written = (self.written or 0) + written
+        elapsed = time.monotonic() - self.started
+        rate = self.rows / elapsed if elapsed else 0
+        line = f"\r{self.label}: {self.rows} rows ({rate:.0f} rows/s)"
+        if self.written is not None:
+            line += f", {self.written} written, {self.rows - self.written} skipped"
+        print(line, end="", file=sys.stderr)
+
+    def done(self):
+        print(file=sys.stderr)
+
+def export_table(conn, table: str, path: Path, chunk_size: int):
+    """Stream all rows of table to a CSV or JSONL file"""
+    columns = TABLES[table]
+    fmt = file_format(path)
+    progress = Progress(f"export {table}")
+
+    cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            if writer:
+                writer.writerows(rows)
+            else:
+                f.writelines(
+                    json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+                    for row in rows
+                )
+            progress.update(len(rows))
+    progress.done()
+
+def read_rows(path: Path, columns: list):
+    """Yield rows of a CSV or JSONL file as dicts with the given columns"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if file_format(path) == "csv":
+            for record in csv.DictReader(f):
+                # CSV has no NULL: empty cells become None
+                yield {column: record.get(column) or None for column in columns}
+        else:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield {column: record.get(column) for column in columns}
+
+def import_queries(table: str, on_conflict: str) -> list:
+    """
+    Statements run for every imported row, matching existing rows by
+    NATURAL_KEYS: an UPDATE in replace mode, then an INSERT of rows that do
+    not exist yet. Constraint errors, e.g. a missing NOT NULL value, fail
+    the import.
+    """
+    keys = NATURAL_KEYS[table]
+    columns = [column for column in TABLES[table] if column != "id"]
+    match = " AND ".join(f"{key} = :{key}" for key in keys)
+    insert = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {', '.join(':' + column for column in columns)} "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {match})"
+    )
+    if on_conflict == "skip":
+        return [insert]
+    updates = ", ".join(f"{column} = :{column}" for column in columns if column not in keys)
+    return [f"UPDATE {table} SET {updates} WHERE {match}", insert]
+
+def import_table(conn, table: str, path: Path, chunk_size: int, transaction_size: int, on_conflict: str):
+    """Stream rows from a CSV or JSONL file into table with executemany"""
+    queries = import_queries(table, on_conflict)
+    progress = Progress(f"import {table}")
+
+    rows = read_rows(path, TABLES[table])
+    committed = 0
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            changes = conn.total_changes
+            for query in queries:
+                conn.executemany(query, chunk)
+            progress.update(len(chunk), conn.total_changes - changes)
+            if progress.rows - committed >= transaction_size:
+                conn.commit()
+                committed = progress.rows
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        progress.done()
+        if committed:
+            # Earlier transactions are not undone
+            print(f"The first {committed} rows were committed and stay imported; "
+                  f"the error is in a later row", file=sys.stderr)
+        raise
+    progress.done()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of bot tables")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("file", type=Path, help=".csv or .jsonl file")
+    parser.add_argument("--db", type=Path, default=Path("data/bot.db"))
+    parser.add_argument("--chunk-size", type=int, default=5000,
+                        help="rows read or written per step")
+    parser.add_argument("--transaction-size", type=int, default=100000,
+                        help="rows per committed transaction on import; an error "
+                             "rolls back only the current transaction")
+    parser.add_argument("--on-conflict", choices=["skip", "replace"], default="skip",
+                        help="what to do with rows that already exist (same user_id, "
+                             "and for subscriptions the same start_date); "
+                             "other invalid rows abort the import")
+    args = parser.parse_args()
+
+    try:
+        file_format(args.file)
+    except ValueError as e:
+        parser.error(str(e))
+
+    conn = connect_to_db(args.db)
+    if not conn:
+        sys.exit(1)
+    try:
+        if args.action == "export":
+            export_table(conn, args.table, args.file, args.chunk_size)
+        else:
+            import_table(conn, args.table, args.file, args.chunk_size,
+                         args.transaction_size, args.on_conflict)
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Error during {args.action} of {args.table}: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,174 +1,239 @@
+"""
+Database viewer.
+
+    python tools/db_viewer.py users --username-prefix jo --limit 20
+    python tools/db_viewer.py subscriptions --plan 1month --active --expires-within 7
+    python tools/db_viewer.py report plans
+    python tools/db_viewer.py report referrals --limit 10
+
+Listings are paginated by id: pass the printed --after value to get the
+next page. Every query is a short indexed read, so the viewer can be used
+on a live database.
+"""
+import argparse
 import sqlite3
-from datetime import datetime
-import os
+import sys
+from datetime import datetime, timedelta
 from pathlib import Path
 
-def connect_to_db():
-    """Connect to the database"""
-    db_path = Path("data/bot.db")
+# Allow running as a script from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config.config import SUBSCRIPTION_PLANS
+
+def connect_to_db(db_path: Path = Path("data/bot.db")):
+    """Connect to the database read-only"""
     if not db_path.exists():
         print(f"Database not found at {db_path}")
         return None
-    return sqlite3.connect(db_path)
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
 
 def format_date(date_str):
     """Format date string for better readability"""
     try:
         date = datetime.fromisoformat(date_str)
         return date.strftime("%Y-%m-%d %H:%M:%S")
-    except:
+    except (TypeError, ValueError):
         return date_str
 
-def view_users():
-    """View all users in the database"""
-    conn = connect_to_db()
-    if not conn:
-        return
-    
-    cursor = conn.cursor()
-    try:
-        # Сначала получим информацию о структуре таблицы
-        cursor.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in cursor.fetchall()]
-        print("\n=== Users ===")
-        print(f"Table columns: {columns}")
-        
-        cursor.execute("SELECT * FROM users")
-        users = cursor.fetchall()
-        
-        if not users:
-            print("\nNo users found in database")
-            return
-        
-        print(f"\nTotal users: {len(users)}")
-        print("\n" + " | ".join(columns))
-        print("-" * (len(columns) * 15))
-        
-        for user in users:
-            print(" | ".join(str(value) if value is not None else 'None' for value in user))
-            
-    except sqlite3.Error as e:
-        print(f"Error reading users: {e}")
-    finally:
-        conn.close()
+def prefix_range(prefix: str):
+    """Bounds [low, high) of strings starting with prefix, usable by an index"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
 
-def view_subscriptions():
-    """View all subscriptions in the database"""
-    conn = connect_to_db()
-    if not conn:
+def print_rows(title: str, columns: list, rows: list, limit: int):
+    """Print a page of rows and how to fetch the next one"""
+    print(f"\n=== {title} ===")
+    if not rows:
+        print("\nNo rows found")
         return
-    
-    cursor = conn.cursor()
+
+    print("\n" + " | ".join(columns))
+    print("-" * (len(columns) * 15))
+    for row in rows:
+        formatted_values = []
+        for column, value in zip(columns, row):
+            if 'date' in column and value:
+                value = format_date(value)
+            formatted_values.append(str(value) if value is not None else 'None')
+        print(" | ".join(formatted_values))
+
+    print(f"\nShown: {len(rows)}")
+    if len(rows) == limit:
+        print(f"Next page: --after {rows[-1][0]}")
+
+def view_users(conn, after: int = 0, limit: int = 50, user_id: int = None, username_prefix: str = None):
+    """View a page of users"""
+    conditions = ["id > ?"]
+    params = [after]
+    if user_id is not None:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if username_prefix:
+        conditions.append("username >= ? AND username < ?")
+        params.extend(prefix_range(username_prefix))
+
+    columns = ["id", "user_id", "username", "name", "created_at",
+               "is_active", "referrer_id", "referral_count"]
+    rows = conn.execute(
+        f"""
+        SELECT {', '.join(columns)} FROM users
+        WHERE {' AND '.join(conditions)}
+        ORDER BY id LIMIT ?
+        """,
+        (*params, limit)
+    ).fetchall()
+    print_rows("Users", columns, rows, limit)
+
+def view_subscriptions(
+    conn,
+    after: int = 0,
+    limit: int = 50,
+    user_id: int = None,
+    plan: str = None,
+    active: bool = False,
+    expires_within: float = None
+):
+    """View a page of subscriptions"""
+    now = datetime.now()
+    conditions = ["s.id > ?"]
+    params = [after]
+    if user_id is not None:
+        conditions.append("s.user_id = ?")
+        params.append(user_id)
+    if plan:
+        conditions.append("s.subscription_type = ?")
+        params.append(plan)
+    if active or expires_within is not None:
+        conditions.append("s.is_active = TRUE AND s.end_date > ?")
+        params.append(now)
+    if expires_within is not None:
+        conditions.append("s.end_date <= ?")
+        params.append(now + timedelta(days=expires_within))
+
+    columns = ["id", "user_id", "subscription_type", "start_date",
+               "end_date", "is_active", "username"]
+    rows = conn.execute(
+        f"""
+        SELECT s.id, s.user_id, s.subscription_type, s.start_date,
+               s.end_date, s.is_active, u.username
+        FROM subscriptions s
+        LEFT JOIN users u ON s.user_id = u.user_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY s.id LIMIT ?
+        """,
+        (*params, limit)
+    ).fetchall()
+    print_rows("Subscriptions", columns, rows, limit)
+
+def report_plans(conn):
+    """Subscriptions and revenue per plan"""
+    counts = {
+        plan_id: (total, active)
+        for plan_id, total, active in conn.execute(
+            """
+            SELECT subscription_type,
+                   COUNT(*),
+                   SUM(is_active = TRUE AND end_date > ?)
+            FROM subscriptions
+            GROUP BY subscription_type
+            """,
+            (datetime.now(),)
+        ).fetchall()
+    }
+
     try:
-        # Получаем структуру таблицы
-        cursor.execute("PRAGMA table_info(subscriptions)")
-        columns = [column[1] for column in cursor.fetchall()]
-        all_columns = columns + ["username"]  # Добавляем столбец username
-        
-        print("\n=== Subscriptions ===")
-        print(f"Table columns: {all_columns}")
-        
-        cursor.execute("""
-            SELECT s.*, u.username 
-            FROM subscriptions s
-            LEFT JOIN users u ON s.user_id = u.user_id
-            ORDER BY s.start_date DESC
-        """)
-        subscriptions = cursor.fetchall()
-        
-        if not subscriptions:
-            print("\nNo subscriptions found in database")
-            return
-        
-        print(f"\nTotal subscriptions: {len(subscriptions)}")
-        print("\n" + " | ".join(all_columns))
-        print("-" * (len(all_columns) * 15))
-        
-        for sub in subscriptions:
-            formatted_values = []
-            for i, value in enumerate(sub):
-                # Проверяем, является ли поле датой (только для столбцов из основной таблицы)
-                if i < len(columns) and 'date' in columns[i].lower() and value:
-                    value = format_date(value)
-                formatted_values.append(str(value) if value is not None else 'None')
-            print(" | ".join(formatted_values))
-            
-    except sqlite3.Error as e:
-        print(f"Error reading subscriptions: {e}")
-    finally:
-        conn.close()
+        revenue_by_plan = dict(conn.execute(
+            "SELECT plan_id, SUM(total_amount) FROM payments GROUP BY plan_id"
+        ).fetchall())
+        exact = True
+    except sqlite3.OperationalError:
+        # Database from before the payments table; estimate from plan prices
+        revenue_by_plan = {}
+        exact = False
+
+    # Extensions of another plan's subscription are paid under their own
+    # plan_id, so a plan may have revenue but no subscription rows
+    plan_ids = sorted(set(counts) | set(revenue_by_plan), key=str)
+
+    print("\n=== Subscriptions per plan ===")
+    print("\nplan | total | active | price | revenue")
+    print("-" * 60)
+    total_revenue = 0
+    for plan_id in plan_ids:
+        total, active = counts.get(plan_id, (0, 0))
+        price = SUBSCRIPTION_PLANS.get(plan_id, {}).get("price", 0)
+        if exact:
+            revenue = revenue_by_plan.get(plan_id, 0)
+        else:
+            revenue = price * total
+        total_revenue += revenue
+        print(f"{plan_id} | {total} | {active} | {price} | {revenue}")
+    if exact:
+        print(f"\nRevenue: {total_revenue} stars")
+    else:
+        # Extensions update an existing row, so this is a lower bound
+        print(f"\nEstimated revenue: {total_revenue} stars")
+
+def report_referrals(conn, limit: int = 20):
+    """Users with the most referrals"""
+    rows = conn.execute(
+        """
+        SELECT user_id, username, referral_count FROM users
+        WHERE referral_count > 0
+        ORDER BY referral_count DESC LIMIT ?
+        """,
+        (limit,)
+    ).fetchall()
+
+    print("\n=== Referral leaderboard ===")
+    print("\nrank | user_id | username | referrals")
+    print("-" * 60)
+    for rank, (user_id, username, count) in enumerate(rows, start=1):
+        print(f"{rank} | {user_id} | {username} | {count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Database viewer")
+    parser.add_argument("--db", type=Path, default=Path("data/bot.db"))
+    commands = parser.add_subparsers(dest="command", required=True)
 
-def view_active_subscriptions():
-    """View only active subscriptions"""
-    conn = connect_to_db()
+    users = commands.add_parser("users", help="list users")
+    users.add_argument("--after", type=int, default=0, help="show rows with id greater than this")
+    users.add_argument("--limit", type=int, default=50)
+    users.add_argument("--user-id", type=int)
+    users.add_argument("--username-prefix")
+
+    subscriptions = commands.add_parser("subscriptions", help="list subscriptions")
+    subscriptions.add_argument("--after", type=int, default=0, help="show rows with id greater than this")
+    subscriptions.add_argument("--limit", type=int, default=50)
+    subscriptions.add_argument("--user-id", type=int)
+    subscriptions.add_argument("--plan", choices=sorted(SUBSCRIPTION_PLANS) + ["referral_bonus"])
+    subscriptions.add_argument("--active", action="store_true", help="only active subscriptions")
+    subscriptions.add_argument("--expires-within", type=float, metavar="DAYS",
+                               help="only active subscriptions ending within DAYS")
+
+    report = commands.add_parser("report", help="aggregate reports")
+    report.add_argument("name", choices=["plans", "referrals"])
+    report.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+
+    conn = connect_to_db(args.db)
     if not conn:
-        return
-    
-    cursor = conn.cursor()
+        sys.exit(1)
     try:
-        # Получаем структуру таблицы
-        cursor.execute("PRAGMA table_info(subscriptions)")
-        columns = [column[1] for column in cursor.fetchall()]
-        all_columns = columns + ["username"]  # Добавляем столбец username
-        
-        cursor.execute("""
-            SELECT s.*, u.username
-            FROM subscriptions s
-            LEFT JOIN users u ON s.user_id = u.user_id
-            WHERE s.is_active = 1
-            AND s.end_date > datetime('now')
-            ORDER BY s.end_date ASC
-        """)
-        subscriptions = cursor.fetchall()
-        
-        if not subscriptions:
-            print("\nNo active subscriptions found")
-            return
-        
-        print("\n=== Active Subscriptions ===")
-        print(f"Total active: {len(subscriptions)}")
-        print("\n" + " | ".join(all_columns))
-        print("-" * (len(all_columns) * 15))
-        
-        for sub in subscriptions:
-            formatted_values = []
-            for i, value in enumerate(sub):
-                # Проверяем, является ли поле датой (только для столбцов из основной таблицы)
-                if i < len(columns) and 'date' in columns[i].lower() and value:
-                    value = format_date(value)
-                formatted_values.append(str(value) if value is not None else 'None')
-            print(" | ".join(formatted_values))
-            
+        if args.command == "users":
+            view_users(conn, args.after, args.limit, args.user_id, args.username_prefix)
+        elif args.command == "subscriptions":
+            view_subscriptions(conn, args.after, args.limit, args.user_id, args.plan,
+                               args.active, args.expires_within)
+        elif args.name == "plans":
+            report_plans(conn)
+        else:
+            report_referrals(conn, args.limit)
     except sqlite3.Error as e:
-        print(f"Error reading active subscriptions: {e}")
+        print(f"Error reading database: {e}")
+        sys.exit(1)
     finally:
         conn.close()
 
-def main():
-    """Main menu for database viewer"""
-    while True:
-        print("\n=== Database Viewer ===")
-        print("1. View all users")
-        print("2. View all subscriptions")
-        print("3. View active subscriptions")
-        print("4. Exit")
-        
-        choice = input("\nEnter your choice (1-4): ")
-        
-        if choice == "1":
-            view_users()
-        elif choice == "2":
-            view_subscriptions()
-        elif choice == "3":
-            view_active_subscriptions()
-        elif choice == "4":
-            print("\nGoodbye!")
-            break
-        else:
-            print("\nInvalid choice. Please try again.")
-        
-        input("\nPress Enter to continue...")
-        os.system('cls' if os.name == 'nt' else 'clear')
-
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
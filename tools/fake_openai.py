@@ -0,0 +1,83 @@
+"""
+Minimal OpenAI-compatible server for trying OpenAIService locally.
+
+    python tools/fake_openai.py --port 8081 --delay 0.05
+
+then set OPENAI_BASE_URL=http://127.0.0.1:8081/v1. POST /v1/chat/completions
+echoes the last user message back word by word, cut to about max_tokens,
+streamed when the request asks for stream=true.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+def completion_words(body: dict) -> list:
+    """Words of the fake reply to a chat completion request"""
+    user_messages = [m["content"] for m in body.get("messages", []) if m.get("role") == "user"]
+    prompt = user_messages[-1] if user_messages else ""
+    reply = f"You said: {prompt}"
+    if body.get("max_tokens"):
+        # About 4 characters per token, like the bot's own estimate
+        reply = reply[:body["max_tokens"] * 4]
+    return reply.split(" ")
+
+def chunk_event(model: str, created: int, delta: dict, finish_reason=None) -> bytes:
+    chunk = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+async def chat_completions(request: web.Request) -> web.StreamResponse:
+    body = await request.json()
+    model = body.get("model", "fake")
+    created = int(time.time())
+    words = completion_words(body)
+    delay = request.app["delay"]
+
+    if not body.get("stream"):
+        await asyncio.sleep(delay * len(words))
+        return web.json_response({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+        })
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    await response.write(chunk_event(model, created, {"role": "assistant", "content": ""}))
+    for i, word in enumerate(words):
+        await asyncio.sleep(delay)
+        await response.write(chunk_event(model, created, {"content": word if i == 0 else " " + word}))
+    await response.write(chunk_event(model, created, {}, "stop"))
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds between streamed words")
+    args = parser.parse_args()
+
+    app = web.Application()
+    app["delay"] = args.delay
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    web.run_app(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
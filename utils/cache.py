@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# Returned by TTLCache.get() on a miss, so None can be cached as a value
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire ttl seconds after being stored.
+
+    Not thread-safe; meant to be used from the event loop thread only.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every invalidation, see set()
+        self.generation = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Return cached value and mark it as recently used"""
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """
+        Store value, evicting the least recently used entry when full.
+
+        Pass the generation read before loading the value: if the cache was
+        invalidated in the meantime the value may be stale and is dropped.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop cached value for key"""
+        self.generation += 1
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all cached values"""
+        self.generation += 1
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
@@ -0,0 +1,48 @@
+from string import Formatter
+from typing import Any, Optional, Tuple
+
+CONVERSIONS = {"s": str, "r": repr, "a": ascii}
+
+
+class Template:
+    """
+    A screen text compiled once from its lines.
+
+    Per-user values are written as {name}, {name:spec} or {name!r} fields,
+    as with str.format; literal braces must be doubled. The text is split
+    into literal parts and fields when the template is created, so
+    render() only formats the field values. Screens without fields render
+    to the same string object every time.
+    """
+
+    __slots__ = ("name", "text", "fields", "_parts")
+
+    def __init__(self, name: str, *lines: str):
+        self.name = name
+        self.text = "\n".join(lines)
+        # (literal text, field name or None, format spec, conversion or None)
+        parts: Tuple[Tuple[str, Optional[str], str, Optional[str]], ...] = tuple(
+            Formatter().parse(self.text)
+        )
+        for _, field, spec, _ in parts:
+            if field is not None and (not field.isidentifier() or "{" in spec):
+                raise ValueError(
+                    f"Template {name!r}: field {{{field}}} must be a plain name "
+                    f"without nested fields"
+                )
+        self._parts = parts
+        self.fields = frozenset(field for _, field, _, _ in parts if field is not None)
+
+    def render(self, **values: Any) -> str:
+        if not self.fields:
+            return self.text
+        pieces = []
+        for literal, field, spec, conversion in self._parts:
+            if literal:
+                pieces.append(literal)
+            if field is not None:
+                value = values[field]
+                if conversion:
+                    value = CONVERSIONS[conversion](value)
+                pieces.append(format(value, spec))
+        return "".join(pieces)